@@ -0,0 +1,114 @@
+# 文件名: benchmarks/bench_diff.py
+#
+# 对比旧的"整表读入 dict"比较方式与临时表 + 主键连接的集合比较方式。
+# 用法: python benchmarks/bench_diff.py [历史SKU数] [本次抓取数]
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core_scraper import CoreScraper  # noqa: E402
+
+
+def build_scraper(workdir):
+    config_path = os.path.join(workdir, "bench_config.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "site_name": "Bench",
+            "db_path": os.path.join(workdir, "bench.db"),
+            "log_path": os.path.join(workdir, "bench.log"),
+            "table_name": "bench_products",
+            "bark_urls": [],
+            "icon_url": "",
+        }, f)
+    return CoreScraper(config_path)
+
+
+def seed_history(scraper, history):
+    conn = scraper.connect_db()
+    rows = (
+        (f"SKU{i:08d}", f"P{i // 10:07d}", f"Product {i}", f"https://example.com/p/{i}",
+         f"https://example.com/i/{i}.jpg", 100.0, 100.0, 0, None, None,
+         1 if i % 5 else 0, "2025-01-01 00:00:00", 0 if i % 5 else 10, 0 if i % 5 else -10)
+        for i in range(history)
+    )
+    with scraper.transaction():
+        conn.executemany(f"""
+            INSERT INTO {scraper.table_name}
+            (sku_id, product_id, name, url, image_url, list_price, sale_price,
+             discount_percentage, color, size, is_active, last_seen, miss_count, last_seen_gen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+
+def make_run(history, size):
+    products = []
+    for i in random.sample(range(history), size - size // 20):
+        price = 80.0 if i % 7 == 0 else 100.0
+        products.append({
+            "sku_id": f"SKU{i:08d}", "product_id": f"P{i // 10:07d}", "name": f"Product {i}",
+            "url": f"https://example.com/p/{i}", "image_url": f"https://example.com/i/{i}.jpg",
+            "list_price": 100.0, "sale_price": price, "discount_percentage": 100 - price,
+            "color": None, "size": None,
+        })
+    for i in range(size // 20):
+        products.append({
+            "sku_id": f"NEW{i:08d}", "product_id": f"N{i:07d}", "name": f"New {i}",
+            "url": "", "image_url": "", "list_price": 100.0, "sale_price": 100.0,
+            "discount_percentage": 0, "color": None, "size": None,
+        })
+    return products
+
+
+def legacy_diff(scraper, products):
+    """旧实现：整表读入 dict 后在 Python 中逐个比较（只计算变化数，不发通知）。"""
+    cursor = scraper.connect_db().cursor()
+    cursor.execute(f"SELECT sku_id, sale_price, is_active, miss_count FROM {scraper.table_name}")
+    old_products = {
+        row['sku_id']: {'sale_price': row['sale_price'], 'is_active': row['is_active'],
+                        'miss_count': row['miss_count']}
+        for row in cursor.fetchall()
+    }
+    changes = 0
+    for p in products:
+        old_p = old_products.get(p["sku_id"])
+        if (not old_p or (old_p['sale_price'] is not None and p["sale_price"] < old_p['sale_price'])
+                or (not old_p['is_active'] and old_p['miss_count'] >= 3)):
+            changes += 1
+    return changes
+
+
+def measure(label, func):
+    """先单独计时，再在 tracemalloc 下重跑一次取内存峰值（tracemalloc 会拖慢计时）。"""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} 耗时 {elapsed * 1000:9.1f} ms | Python 峰值内存 {peak / 1024 / 1024:8.1f} MB")
+
+
+if __name__ == "__main__":
+    history = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 3_000
+    random.seed(42)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        scraper = build_scraper(workdir)
+        scraper.send_bark_notification = lambda *args: None
+        scraper.log = lambda message: None
+        print(f"写入 {history} 条历史 SKU ...")
+        seed_history(scraper, history)
+        products = make_run(history, size)
+        print(f"本次抓取 {len(products)} 个商品\n")
+
+        measure("dict 比较", lambda: legacy_diff(scraper, products))
+        measure("集合比较", lambda: scraper.check_and_notify(products))
+        scraper.close_db()
@@ -0,0 +1,114 @@
+# 文件名: benchmarks/bench_extraction.py
+#
+# 在合成的 Sporting Life 商品网格上对比两种 HTML 抽取方式的单卡片耗时：
+#   1. 旧方式：BeautifulSoup(lxml) 建树，每个卡片 5 次 select_one + 嵌套的价格清理函数
+#   2. 新方式：lxml 直接建树，执行配置中 extraction 规则预编译出的 XPath
+# 两种方式的结果会逐项比对，确保抽取内容一致。
+# 用法: python benchmarks/bench_extraction.py [卡片数] [重复次数]
+
+import json
+import os
+import sys
+import time
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from extraction import ExtractionSpec  # noqa: E402
+
+BASE_URL = "https://www.sportinglife.ca"
+
+TILE_HTML = """
+<div class="grid-tile">
+  <div class="product-tile" data-itemid="{pid}-{var}">
+    <div class="product-image">
+      <a class="thumb-link" href="/en-CA/arcteryx/product-{pid}.html?dwvar={var}">
+        <img src="https://cdn.example.com/images/{pid}_{var}.jpg" alt="Beta Jacket {pid}">
+      </a>
+    </div>
+    <div class="product-name"><a class="name-link" href="#"><span class="product-name"> Beta Jacket {pid} </span></a></div>
+    <div class="product-pricing"><div class="product-price">
+      {standard}<span class="price-sales">{sale}</span>
+    </div></div>
+    <div class="product-swatches"><ul><li><a class="swatch"></a></li><li><a class="swatch"></a></li></ul></div>
+  </div>
+</div>
+"""
+
+
+def build_page(tiles):
+    body = []
+    for i in range(tiles):
+        if i % 3 == 0:
+            standard, sale = '<span class="price-standard">1 100,00 $</span>', "879,99 $"
+        else:
+            standard, sale = "", f"${200 + i % 50},{i % 10}00.00" if i % 7 == 0 else f"${300 + i % 90}.00"
+        body.append(TILE_HTML.format(pid=100000 + i, var=i % 5, standard=standard, sale=sale))
+    return f"<html><head><title>Arc'teryx</title></head><body><div class=\"search-result-items\">{''.join(body)}</div></body></html>"
+
+
+def parse_with_soup(html_text):
+    """旧 SportingLifeScraper.parse_data 的抽取逻辑（去掉日志）。"""
+    soup = BeautifulSoup(html_text, 'lxml')
+    products = []
+    for tile in soup.select('div.product-tile'):
+        name_tag = tile.select_one('span.product-name')
+        link_tag = tile.select_one('a.thumb-link')
+        image_tag = tile.select_one('a.thumb-link img')
+        item_id = tile.get('data-itemid')
+        if not (name_tag and link_tag and item_id):
+            continue
+
+        def clean_and_convert_price(price_tag):
+            if not price_tag:
+                return 0.0
+            cleaned_str = price_tag.text.strip().replace('$', '').replace(' ', '').replace(',', '.')
+            if cleaned_str.count('.') > 1:
+                parts = cleaned_str.split('.')
+                cleaned_str = "".join(parts[:-1]) + "." + parts[-1]
+            return float(cleaned_str)
+
+        sale_price = clean_and_convert_price(tile.select_one('span.price-sales'))
+        list_tag = tile.select_one('span.price-standard')
+        list_price = clean_and_convert_price(list_tag) if list_tag else sale_price
+        discount = round((1 - sale_price / list_price) * 100) if list_price > sale_price > 0 else 0
+        products.append({
+            "sku_id": item_id, "product_id": item_id.split('-')[0], "name": name_tag.text.strip(),
+            "url": urljoin(BASE_URL, link_tag.get('href')),
+            "image_url": image_tag.get('src') if image_tag else None,
+            "list_price": list_price, "sale_price": sale_price, "discount_percentage": discount,
+            "color": None, "size": None
+        })
+    return products
+
+
+def timed(label, func, html_text, rounds):
+    result = func(html_text)  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(html_text)
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{label:<28} {elapsed * 1000:8.2f} ms/页 | {elapsed / len(result) * 1e6:7.1f} µs/卡片 | {len(result)} 个商品")
+    return result, elapsed
+
+
+if __name__ == "__main__":
+    tiles = int(sys.argv[1]) if len(sys.argv) > 1 else 230
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with open(os.path.join(ROOT, "configs", "sportinglife_config.json"), encoding="utf-8") as f:
+        spec = ExtractionSpec(json.load(f)["extraction"])
+    html_text = build_page(tiles)
+    print(f"页面大小 {len(html_text) / 1024:.0f} KB，{tiles} 个卡片，重复 {rounds} 次")
+
+    soup_result, soup_time = timed("BeautifulSoup select_one", parse_with_soup, html_text, rounds)
+    spec_result, spec_time = timed("预编译 XPath (extraction)",
+                                   lambda text: spec.extract(text, BASE_URL), html_text, rounds)
+    print(f"加速比: {soup_time / spec_time:.1f}x")
+
+    mismatches = [(a, b) for a, b in zip(soup_result, spec_result) if a != b]
+    if len(soup_result) != len(spec_result) or mismatches:
+        print(f"❌ 结果不一致（{len(soup_result)} vs {len(spec_result)}），示例: {mismatches[:1]}")
+        sys.exit(1)
+    print("✅ 两种方式抽取结果一致")
@@ -0,0 +1,70 @@
+# 文件名: benchmarks/bench_lacordee_extract.py
+#
+# 在本地夹具页面上对比两种 LaCordee 商品卡片提取方式的耗时：
+#   1. 旧方式：每个卡片约 10 次 query_selector / inner_text / get_attribute（每次都是一次 IPC 往返）
+#   2. 新方式：一次 eval_on_selector_all 在页面内提取全部字段，返回纯 JSON
+# 用法: python benchmarks/bench_lacordee_extract.py [重复次数]
+
+import os
+import sys
+import time
+
+from playwright.sync_api import sync_playwright
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lacordee_scraper import EXTRACT_TILES_JS, TILE_SELECTOR  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "lacordee_search.html")
+
+
+def extract_per_element(page):
+    """旧实现的逐元素提取（只取原始字段，不做价格和 ID 处理）。"""
+    tiles = []
+    for item in page.query_selector_all(TILE_SELECTOR):
+        link_elem = item.query_selector('a.item-name-YL8')
+        name_elem = item.query_selector('h3')
+        sale_elem = item.query_selector('span.price-specialPrice-6Lo')
+        orig_elem = item.query_selector('span.price-normalPrice-zvG')
+        color_elem = item.query_selector('dd')
+        swatch_elem = item.query_selector('button.swatch-button-cZb[title]')
+        img_elem = item.query_selector('img[class*="item-imageLoaded"]') or item.query_selector('img')
+        tiles.append({
+            "href": link_elem.get_attribute('href') if link_elem else None,
+            "name": name_elem.inner_text().strip() if name_elem else None,
+            "sale": sale_elem.inner_text().strip() if sale_elem else None,
+            "orig": orig_elem.inner_text().strip() if orig_elem else None,
+            "color": color_elem.inner_text().strip() if color_elem else None,
+            "swatch": swatch_elem.get_attribute('title') if swatch_elem else None,
+            "img": (img_elem.get_attribute('src') or img_elem.get_attribute('data-src')) if img_elem else None,
+        })
+    return tiles
+
+
+def extract_single_evaluate(page):
+    return page.eval_on_selector_all(TILE_SELECTOR, EXTRACT_TILES_JS)
+
+
+def timed(label, func, page, rounds):
+    result = func(page)  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(page)
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{label:<24} {elapsed * 1000:8.1f} ms/页 | {len(result)} 个卡片")
+    return result
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.set_content(html)
+
+        legacy = timed("逐元素 query_selector", extract_per_element, page, rounds)
+        batched = timed("单次 eval_on_selector_all", extract_single_evaluate, page, rounds)
+        print("两种方式提取结果一致" if legacy == batched else "⚠️ 两种方式提取结果不一致")
+        browser.close()
@@ -0,0 +1,105 @@
+# 文件名: benchmarks/bench_price_parser.py
+#
+# 用价格语料（fixtures/price_corpus.json，来自各站点日志和页面的真实价格文本）：
+#   1. 校验 price_parser 对每条语料的解析结果（整数分）
+#   2. 统计旧的各站点内联清理函数在同一语料上的出错情况
+#   3. 对比旧函数与 price_parser 的单次调用耗时
+# 用法: python benchmarks/bench_price_parser.py [重复次数]
+
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from price_parser import parse_price, parse_price_cents  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "price_corpus.json")
+
+
+def core_clean_price(price_val):
+    """旧 CoreScraper.parse_data 中的 clean_price。"""
+    if isinstance(price_val, list) and price_val: price_val = price_val[0]
+    try: return float(str(price_val).replace('$', '').replace('CA', '').strip())
+    except (ValueError, TypeError): return 0.0
+
+
+def sportinglife_clean_price(text):
+    """旧 SportingLifeScraper 中的 clean_and_convert_price（输入为标签文本）。"""
+    cleaned_str = str(text).strip().replace('$', '').replace(' ', '').replace(',', '.')
+    if cleaned_str.count('.') > 1:
+        parts = cleaned_str.split('.')
+        cleaned_str = "".join(parts[:-1]) + "." + parts[-1]
+    return float(cleaned_str)
+
+
+def regex_clean_price(text):
+    """旧 LaCordeeScraper / MomoSportsScraper 中的 re.sub(r'[^\\d.]', '', ...)。"""
+    if not text: return 0.0
+    return float(re.sub(r'[^\d.]', '', text))
+
+
+OLD_PARSERS = {
+    "CoreScraper.clean_price": core_clean_price,
+    "SportingLife.clean_and_convert": sportinglife_clean_price,
+    "LaCordee/Momo re.sub": regex_clean_price,
+}
+
+
+def check_corpus(corpus):
+    failures = 0
+    for row in corpus:
+        cents = parse_price_cents(row["text"], row["locale"])
+        if cents != row["cents"]:
+            failures += 1
+            print(f"❌ {row['text']!r} ({row['locale']}): 期望 {row['cents']}，得到 {cents}")
+    print(f"price_parser: {len(corpus) - failures}/{len(corpus)} 条语料解析正确")
+    return failures
+
+
+def old_parser_errors(func, corpus):
+    """旧函数抛异常、或结果与期望不符（期望无法解析时旧函数返回 0 视为正确）的条数。"""
+    wrong = 0
+    for row in corpus:
+        try:
+            value = func(row["text"])
+        except Exception:
+            wrong += 1
+            continue
+        if int(round(value * 100)) != (row["cents"] or 0):
+            wrong += 1
+    return wrong
+
+
+def timed(func, inputs, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for args in inputs:
+            try:
+                func(*args)
+            except Exception:
+                pass
+    return (time.perf_counter() - start) / (rounds * len(inputs)) * 1e9
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    failures = check_corpus(corpus)
+    print()
+    for label, func in OLD_PARSERS.items():
+        print(f"{label:<34} 语料出错 {old_parser_errors(func, corpus):2d}/{len(corpus)}")
+    print()
+
+    texts = [(row["text"],) for row in corpus]
+    plain = [("129.99",), ("1100",), (129.0,), ("79.5",)]
+    for label, func in OLD_PARSERS.items():
+        print(f"{label:<34} {timed(func, texts, rounds):7.0f} ns/次（全部语料）")
+    print(f"{'price_parser.parse_price':<34} {timed(parse_price, texts, rounds):7.0f} ns/次（全部语料）")
+    print(f"{'CoreScraper.clean_price':<34} {timed(core_clean_price, plain, rounds):7.0f} ns/次（纯数字）")
+    print(f"{'price_parser.parse_price':<34} {timed(parse_price, plain, rounds):7.0f} ns/次（纯数字快速路径）")
+    sys.exit(1 if failures else 0)
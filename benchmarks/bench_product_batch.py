@@ -0,0 +1,120 @@
+# 文件名: benchmarks/bench_product_batch.py
+#
+# 用合成的 Shopify products.json 目录（默认 10 万个变体）端到端运行两次 ObersonScraper.run()
+# （第一次初始化入库，第二次走比较 + 刷新路径），记录本进程的峰值常驻内存（ru_maxrss）和耗时。
+# products.json 由子进程中的本地 HTTP 服务提供，服务端内存不计入测量。
+# 只依赖 run() 等公共接口，可以在改动前后的代码上分别运行来对比。
+# 用法: python benchmarks/bench_product_batch.py [变体数] [每个商品的变体数]
+
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRODUCTS_PER_PAGE = 250
+COLORS = ["Black", "Orca", "Tatsu", "Void", "Solitude", "Stone Green", "Blaze", "Forage", "Yukon", "Daybreak"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+
+
+def build_page(page, total_products, variants_per_product):
+    products = []
+    for i in range((page - 1) * PRODUCTS_PER_PAGE, min(page * PRODUCTS_PER_PAGE, total_products)):
+        price = 150 + (i % 40) * 25
+        products.append({
+            "id": 7000000 + i,
+            "handle": f"beta-jacket-{i}",
+            "title": f"Beta Jacket Men's {i}",
+            "vendor": "Arc'teryx",
+            "tags": "Men, Jackets, Shell",
+            "images": [{"src": f"//cdn.shopify.com/s/files/1/products/beta-{i}.jpg"}],
+            "variants": [
+                {
+                    "id": 40000000000 + i * 100 + v,
+                    "title": f"{COLORS[v % len(COLORS)]} / {SIZES[v % len(SIZES)]}",
+                    "price": f"{price * 0.8:.2f}" if i % 3 == 0 else f"{price:.2f}",
+                    "compare_at_price": f"{price:.2f}" if i % 3 == 0 else None,
+                }
+                for v in range(variants_per_product)
+            ],
+        })
+    return json.dumps({"products": products}).encode()
+
+
+def serve(port_queue, total_products, variants_per_product):
+    pages = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            page = int(parse_qs(urlparse(self.path).query).get("page", ["1"])[0])
+            if page not in pages:
+                pages[page] = build_page(page, total_products, variants_per_product)
+            body = pages[page]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == "__main__":
+    total_variants = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    variants_per_product = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    total_products = -(-total_variants // variants_per_product)
+    page_count = -(-total_products // PRODUCTS_PER_PAGE)
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve, args=(port_queue, total_products, variants_per_product), daemon=True
+    )
+    server.start()
+    port = port_queue.get()
+
+    sys.path.insert(0, ROOT)
+    from oberson_scraper import ObersonScraper  # noqa: E402
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config_path = os.path.join(workdir, "bench_config.json")
+        with open(config_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "site_name": "Bench",
+                "base_url": f"http://127.0.0.1:{port}",
+                "main_page_url": f"http://127.0.0.1:{port}/collections/arcteryx",
+                "db_path": os.path.join(workdir, "bench.db"),
+                "log_path": os.path.join(workdir, "bench.log"),
+                "table_name": "bench_products",
+                "bark_urls": [],
+                "icon_url": "",
+                "delay": 0,
+                "fast_path": "feed",
+                "pages_to_scrape": list(range(1, page_count + 1)),
+            }, f)
+
+        scraper = ObersonScraper(config_path)
+        baseline = peak_rss_mb()
+        print(f"{total_variants} 个变体（{total_products} 个商品 × {variants_per_product}），{page_count} 页")
+        print(f"启动后峰值内存: {baseline:.0f} MB")
+        for label in ("首次运行（初始化入库）", "第二次运行（比较 + 刷新）"):
+            start = time.perf_counter()
+            scraper.run()
+            print(f"{label:<16} 耗时 {time.perf_counter() - start:6.2f}s | 峰值内存 {peak_rss_mb():.0f} MB")
+        scraper.close()
+    server.terminate()
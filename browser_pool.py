@@ -0,0 +1,349 @@
+# 文件名: browser_pool.py
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from playwright.sync_api import sync_playwright
+
+# 默认屏蔽的第三方广告 / 统计域名
+DEFAULT_BLOCKED_HOSTS = [
+    "googletagmanager.com", "google-analytics.com", "doubleclick.net", "googlesyndication.com",
+    "facebook.net", "connect.facebook.com", "hotjar.com", "criteo.com", "criteo.net",
+    "bat.bing.com", "clarity.ms", "tiktok.com", "pinterest.com", "snapchat.com",
+    "klaviyo.com", "cdn.segment.com", "newrelic.com", "nr-data.net",
+]
+
+# 资源类型对应的 URL 通配，用于 CDP 方式屏蔽（CDP 只能按 URL 匹配）
+TYPE_URL_PATTERNS = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*"],
+    "stylesheet": ["*.css*"],
+}
+
+
+class ResourceBlockPolicy:
+    """
+    页面资源屏蔽策略（按站点配置 resource_blocking）：
+      - block_types: 要屏蔽的资源类型，如 ["image", "media", "font"]
+      - block_hosts: 要屏蔽的第三方域名（默认 DEFAULT_BLOCKED_HOSTS）
+    普通上下文用 route 拦截，可精确按资源类型判断；
+    持久化上下文改用 CDP Network.setBlockedURLs，因为 route 拦截会让 Chromium 绕过 HTTP 缓存。
+    """
+
+    def __init__(self, options=None):
+        options = options or {}
+        self.block_types = set(options.get("block_types", ["image", "media", "font"]))
+        self.block_hosts = tuple(options.get("block_hosts", DEFAULT_BLOCKED_HOSTS))
+
+    def _is_blocked_host(self, url):
+        host = urlparse(url).hostname or ""
+        return any(host == h or host.endswith("." + h) for h in self.block_hosts)
+
+    def _handle_route(self, route):
+        request = route.request
+        if request.resource_type in self.block_types or self._is_blocked_host(request.url):
+            route.abort()
+        else:
+            route.continue_()
+
+    def apply(self, context, page, keep_cache=False):
+        if not keep_cache:
+            context.route("**/*", self._handle_route)
+            return
+        patterns = [p for t in self.block_types for p in TYPE_URL_PATTERNS.get(t, [])]
+        patterns += [f"*://{h}/*" for h in self.block_hosts] + [f"*.{h}/*" for h in self.block_hosts]
+        cdp = context.new_cdp_session(page)
+        cdp.send("Network.enable")
+        cdp.send("Network.setBlockedURLs", {"urls": patterns})
+
+
+class BrowserPool:
+    """
+    常驻 Chromium 浏览器池：进程内只启动一次浏览器（或连接到本地 launch_server 端点），
+    每次使用时分配一个隔离的 context 和 page，用完即关闭。
+    浏览器累计分配 max_uses 次，或进程树内存超过 max_rss_mb 时自动重启回收。
+
+    Playwright 的同步 API 只能在创建它的线程中使用，因此进程内只有一个池，
+    所有浏览器操作（启动、分配页面、回收、关闭）都在同一个浏览器线程中执行（见 iter_in_browser_thread）。
+    """
+
+    def __init__(self, ws_endpoint=None, max_uses=50, max_rss_mb=1500, headless=True, log=print):
+        self.ws_endpoint = ws_endpoint
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.headless = headless
+        self.log = log
+        self._playwright = None
+        self._browser = None
+        self._persistent = {}  # user_data_dir -> 持久化上下文（自带磁盘缓存）
+        self._uses = 0
+
+    def _ensure_playwright(self):
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        return self._playwright
+
+    def _persistent_context(self, user_data_dir, context_options):
+        """
+        按目录复用持久化上下文，JS/CSS 等静态资源可从磁盘缓存命中。
+        上下文被关闭或 Chromium 崩溃时（close 事件）移出缓存，下次使用时重新启动。
+        """
+        context = self._persistent.get(user_data_dir)
+        if context is not None:
+            return context
+        os.makedirs(user_data_dir, exist_ok=True)
+        self.log(f"启动持久化浏览器上下文（磁盘缓存目录: {user_data_dir}）")
+        context = self._ensure_playwright().chromium.launch_persistent_context(
+            user_data_dir, headless=self.headless, **context_options
+        )
+        context.on("close", lambda _: self._forget_persistent(user_data_dir, context))
+        self._persistent[user_data_dir] = context
+        return context
+
+    def _forget_persistent(self, user_data_dir, context):
+        if self._persistent.get(user_data_dir) is context:
+            del self._persistent[user_data_dir]
+
+    def _discard_persistent(self, user_data_dir):
+        """关闭并丢弃某个目录的持久化上下文（磁盘缓存保留在目录中）。"""
+        context = self._persistent.pop(user_data_dir, None)
+        if context is not None:
+            try:
+                context.close()
+            except Exception:
+                pass
+
+    def _open_page(self, user_data_dir, context_options):
+        """分配上下文和页面；持久化上下文已失效（new_page 出错）时丢弃并重新启动一次。"""
+        if not user_data_dir:
+            context = self._ensure_browser().new_context(**context_options)
+            try:
+                return context, context.new_page()
+            except Exception:
+                context.close()
+                raise
+        context = self._persistent_context(user_data_dir, context_options)
+        try:
+            return context, context.new_page()
+        except Exception as e:
+            self.log(f"持久化浏览器上下文不可用（{e}），重新启动")
+            self._discard_persistent(user_data_dir)
+            context = self._persistent_context(user_data_dir, context_options)
+            return context, context.new_page()
+
+    def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        playwright = self._ensure_playwright()
+        if self.ws_endpoint:
+            self.log(f"连接到浏览器服务: {self.ws_endpoint}")
+            self._browser = playwright.chromium.connect(self.ws_endpoint)
+        else:
+            self.log("启动常驻 Chromium 浏览器...")
+            self._browser = playwright.chromium.launch(headless=self.headless)
+        return self._browser
+
+    def _browser_rss_mb(self):
+        """统计本进程下所有 Chromium 子进程的常驻内存（MB），仅支持 Linux，取不到时返回 0。"""
+        if self.ws_endpoint or not os.path.isdir("/proc"):
+            return 0
+        children = {}
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f"/proc/{pid}/stat", "rb") as f:
+                    stat = f.read().decode("utf-8", "replace")
+                ppid = int(stat.rsplit(")", 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(pid))
+            except (OSError, ValueError, IndexError):
+                continue
+
+        total_kb = 0
+        stack = list(children.get(os.getpid(), []))
+        while stack:
+            pid = stack.pop()
+            stack.extend(children.get(pid, []))
+            try:
+                with open(f"/proc/{pid}/status", "r") as f:
+                    status = f.read()
+                if "chrom" not in status.split("\n", 1)[0].lower():
+                    continue
+                for line in status.splitlines():
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+            except (OSError, ValueError):
+                continue
+        return total_kb / 1024
+
+    def _should_recycle(self):
+        if self._uses >= self.max_uses:
+            return f"已使用 {self._uses} 次"
+        rss = self._browser_rss_mb()
+        if self.max_rss_mb and rss > self.max_rss_mb:
+            return f"内存 {rss:.0f}MB 超过上限 {self.max_rss_mb}MB"
+        return None
+
+    def _close_browser(self):
+        # 关闭时 close 事件会从 _persistent 中移除条目，先取快照
+        for context in list(self._persistent.values()):
+            try:
+                context.close()
+            except Exception:
+                pass
+        self._persistent = {}
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        self._uses = 0
+
+    @contextmanager
+    def page(self, user_data_dir=None, block_policy=None, **context_options):
+        """
+        分配一个页面，退出时关闭，必要时回收浏览器。
+        默认使用常驻浏览器里新建的隔离上下文；指定 user_data_dir 时改用该目录的持久化上下文
+        （保留磁盘缓存，只关闭页面）。block_policy 为 ResourceBlockPolicy 时按策略屏蔽资源。
+        使用过程中出错时丢弃该持久化上下文，下次重新启动；分配失败也计入使用次数，照常检查是否需要回收。
+        """
+        context = page = None
+        try:
+            context, page = self._open_page(user_data_dir, context_options)
+            if block_policy is not None:
+                block_policy.apply(context, page, keep_cache=bool(user_data_dir))
+            yield page
+        except Exception:
+            if user_data_dir:
+                self._discard_persistent(user_data_dir)
+            raise
+        finally:
+            try:
+                if user_data_dir:
+                    if page is not None:
+                        page.close()
+                elif context is not None:
+                    context.close()
+            except Exception:
+                pass
+            self._uses += 1
+            reason = self._should_recycle()
+            if reason:
+                self.log(f"回收浏览器（{reason}）")
+                self._close_browser()
+
+    def page_for_site(self, cfg, **context_options):
+        """
+        按站点配置分配页面：resource_blocking 启用资源屏蔽；browser_cache_dir 启用持久化磁盘缓存（可选，默认关闭）。
+        每个持久化上下文都是一个独立的 Chromium 进程，不走共享的常驻浏览器，
+        因此只在单站点部署、磁盘缓存收益明显时才配置；常驻调度器中各站点应共用常驻浏览器。
+        """
+        blocking = cfg.get("resource_blocking")
+        return self.page(
+            user_data_dir=cfg.get("browser_cache_dir"),
+            block_policy=ResourceBlockPolicy(blocking) if blocking is not None else None,
+            **context_options
+        )
+
+    def close(self):
+        self._close_browser()
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+
+_DONE = object()
+_executor = None
+_executor_lock = threading.Lock()
+_browser_thread = None
+_pool = None  # 只在浏览器线程中创建、使用和关闭
+
+
+def _mark_browser_thread():
+    global _browser_thread
+    _browser_thread = threading.current_thread()
+
+
+def _browser_executor():
+    """进程内唯一的浏览器线程（单线程执行器），首次使用时创建。"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="browser", initializer=_mark_browser_thread
+            )
+        return _executor
+
+
+def iter_in_browser_thread(gen_func, *args, **kwargs):
+    """
+    在浏览器线程中运行生成器函数 gen_func(*args, **kwargs)，把它产出的每一项交回调用线程。
+    常驻调度器里各站点的浏览器抓取因此共用同一个池和浏览器，在浏览器线程中依次执行。
+    调用方提前停止迭代时，生成器在浏览器线程中产出下一项后被关闭（退出 page 块、关闭页面）。
+    """
+    items = queue.Queue()
+    stop = threading.Event()
+
+    def drive():
+        if stop.is_set():
+            items.put((_DONE, None))
+            return
+        gen = gen_func(*args, **kwargs)
+        try:
+            for item in gen:
+                if stop.is_set():
+                    break
+                items.put((item, None))
+        except BaseException as e:
+            items.put((_DONE, e))
+            return
+        finally:
+            gen.close()
+        items.put((_DONE, None))
+
+    _browser_executor().submit(drive)
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def get_browser_pool(cfg=None, log=print):
+    """返回进程内共享的浏览器池（只能在浏览器线程中调用）；首次创建时读取配置中的 browser_pool 选项。"""
+    global _pool
+    if threading.current_thread() is not _browser_thread:
+        raise RuntimeError("浏览器池只能在浏览器线程中使用，请通过 iter_in_browser_thread 调用")
+    if _pool is None:
+        options = (cfg or {}).get("browser_pool", {})
+        _pool = BrowserPool(
+            ws_endpoint=options.get("ws_endpoint"),
+            max_uses=options.get("max_uses", 50),
+            max_rss_mb=options.get("max_rss_mb", 1500),
+            log=log,
+        )
+    return _pool
+
+
+def close_browser_pool():
+    """在浏览器线程中关闭浏览器池（如果存在），可以从任意线程调用，等待关闭完成。"""
+    def close():
+        global _pool
+        pool, _pool = _pool, None
+        if pool is not None:
+            pool.close()
+
+    if _pool is not None:
+        _browser_executor().submit(close).result()
@@ -0,0 +1,63 @@
+# 文件名: cookie_store.py
+
+import json
+import os
+import threading
+import time
+
+
+class CookieStore:
+    """
+    持久化的 Cookie 罐，按域名保存在数据库旁边的 JSON 文件中，跨运行复用。
+    每个 Cookie 记录自己的过期时间；服务端未给出过期时间的会话 Cookie 按 default_ttl 秒计算。
+    """
+
+    def __init__(self, path, default_ttl=21600):
+        self.path = path
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, data):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, host):
+        """返回该域名下所有未过期的 Cookie（字典列表）。"""
+        now = time.time()
+        with self._lock:
+            cookies = self._read().get(host, [])
+        return [c for c in cookies if c.get("expires") and c["expires"] > now]
+
+    def save(self, host, cookies):
+        """覆盖保存该域名的 Cookie；没有过期时间的按 default_ttl 补上。"""
+        now = time.time()
+        records = []
+        for c in cookies:
+            record = dict(c)
+            if not record.get("expires"):
+                record["expires"] = now + self.default_ttl
+            if record["expires"] > now:
+                records.append(record)
+        with self._lock:
+            data = self._read()
+            data[host] = records
+            self._write(data)
+        return len(records)
+
+    def clear(self, host):
+        with self._lock:
+            data = self._read()
+            if data.pop(host, None) is not None:
+                self._write(data)
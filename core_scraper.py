@@ -1,22 +1,66 @@
 # 文件名: core_scraper.py
 
 import os
+import copy
+import queue
+import random
+import hashlib
 import json
 import sqlite3
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 
-# 尝试导入 curl_cffi，如果失败则回退到 requests
-try:
-    from curl_cffi import requests
-    CURL_CFFI_AVAILABLE = True
+from cookie_store import CookieStore
+from extraction import ExtractionSpec
+from notifier import BarkDispatcher
+from outbox import OutboxSender
+from parse_pool import completed, extract_products, get_parse_pool
+from price_parser import parse_price
+from product_batch import PRODUCT_FIELDS, ProductBatch
+from rate_limiter import get_domain_limiter
+
+from session_pool import CURL_CFFI_AVAILABLE, SessionPool
+
+if CURL_CFFI_AVAILABLE:
     print("成功加载 curl_cffi 库，将用于网络请求。")
-except ImportError:
-    import requests
-    CURL_CFFI_AVAILABLE = False
+else:
     print("未找到 curl_cffi 库，将使用 requests 库。")
 
+# 每个连接建立时设置的 PRAGMA，可通过配置项 sqlite_pragmas 覆盖
+DEFAULT_SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",        # 读写互不阻塞，多个 CronJob 共享数据卷时减少锁冲突
+    "synchronous": "NORMAL",      # WAL 模式下仅在 checkpoint 时 fsync
+    "mmap_size": 268435456,       # 256MB 内存映射读
+    "cache_size": -65536,         # 64MB 页缓存（负数单位为 KB）
+    "temp_store": "MEMORY",
+    "busy_timeout": 30000,        # 其它任务持有写锁时最多等待 30 秒
+}
+
+# 参与内容指纹计算的字段：任一字段变化才需要整行更新
+CONTENT_FIELDS = ("name", "url", "image_url", "list_price", "sale_price",
+                  "discount_percentage", "color", "size")
+
+
+def content_hash(product):
+    """计算商品内容的 64 位指纹（有符号整数，可直接存入 SQLite INTEGER）。"""
+    return content_hash_values(product.get(field) for field in CONTENT_FIELDS)
+
+
+def content_hash_values(values):
+    """按 CONTENT_FIELDS 顺序给出的字段值计算指纹（与 content_hash 结果一致），供 ProductBatch.rows 逐行调用。"""
+    raw = "\x1f".join(map(repr, values))
+    digest = hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def to_cents(price):
+    """把价格转换为整数分，None 保持为 None。"""
+    return None if price is None else int(round(float(price) * 100))
+
 
 class CoreScraper:
     def __init__(self, config_path):
@@ -30,21 +74,58 @@ class CoreScraper:
         self.log_path = self.cfg.get("log_path")
         self.base_url = self.cfg.get("base_url", "")
         self.table_name = self.cfg.get("table_name", f"{self.site_name.lower().replace(' ', '_')}_products")
+        self.outbox_table = f"{self.table_name}_outbox"
+        self.runs_table = f"{self.table_name}_runs"
+        self.history_table = f"{self.table_name}_price_history"
+        self.state_table = f"{self.table_name}_state"
+        self.pages_table = f"{self.table_name}_pages"
         self.impersonate = self.cfg.get("impersonate") if CURL_CFFI_AVAILABLE else None
 
         # --- 通知配置 ---
         self.bark_urls = self.cfg["bark_urls"]
         self.icon_url = self.cfg["icon_url"]
         self.discount_threshold = self.cfg.get("discount_threshold", 0)
+        self.notify_flush_timeout = self.cfg.get("notify_flush_timeout", 30)
+        self.outbox_inline_send = self.cfg.get("outbox", {}).get("inline_send", True)
+        self._pending_alerts = []
 
         # --- 请求配置 ---
         self.api_url = self.cfg.get("api_url")
         self.headers = self.cfg.get("headers", {})
         self.cookies = self.cfg.get("cookies", {})
         self.payload_template = self.cfg.get("payload_template", {})
+        self.price_locale = self.cfg.get("price_locale")  # 价格文本的语言区，如 "fr-CA" / "en-CA"
+        # 配置了 extraction 时按声明式规则解析HTML（选择器在这里一次性编译）
+        self.extraction = (ExtractionSpec(self.cfg["extraction"], self.price_locale)
+                           if self.cfg.get("extraction") else None)
+        # parse_workers 为正数或 "auto" 时，HTML 解析交给进程内共享的解析进程池，与下一页的下载重叠；
+        # 只有多页并发抓取的站点才值得开启，单页站点没有可重叠的下载，应在进程内直接解析
+        parse_workers = self.cfg.get("parse_workers", 0)
+        self.parse_pool = get_parse_pool(parse_workers) if parse_workers and self.extraction is not None else None
+
+        self._limiters = {}  # 域名 -> 本爬虫用到的共享限速器，用于运行统计
+        self.sessions = SessionPool(
+            self.headers, self.cookies, self.impersonate,
+            max_idle_per_host=self.cfg.get("http_pool_size", 8)
+        )
+        self.cookie_store = CookieStore(
+            self.cfg.get("cookie_jar_path")
+            or os.path.join(os.path.dirname(self.db_path), f"{self.table_name}_cookies.json"),
+            default_ttl=self.cfg.get("cookie_ttl", 21600)
+        )
 
         self.conn = None
+        self._db_lock = threading.RLock()
+        self.current_gen = None  # 本次运行的代号（runs 表自增 ID）
+        self.page_size = None  # 本次运行实际使用的每页商品数（见 tuned_page_size）
+        self._crawl = {"fetched": set(), "failed": False, "resumed": False, "bootstrapped": False}  # 本次运行的分页进度
+        self._probed_pages = {}  # (页码, 每页条数) -> 每页条数试探时已抓取的页面结果，正式抓取时复用
+        self._bootstrap_lock = threading.Lock()  # 并发页面遇到 Cookie 失效时只由一个线程重新引导
         self._setup_logging()
+        self.notifier = BarkDispatcher(
+            self._post_bark, max_workers=self.cfg.get("notify_workers", 8), log=self.log
+        )
+        self.outbox = OutboxSender(self)
         self.init_db()
         self.migrate_database()  # 兼容旧数据库
 
@@ -54,28 +135,63 @@ class CoreScraper:
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
         self.log_file = open(self.log_path, 'a', encoding='utf-8')
+        self._log_lock = threading.Lock()
         print(f"日志将记录在: {self.log_path}")
 
     def log(self, message):
         """记录一条日志信息。"""
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         log_entry = f"[{timestamp}] {message}"
-        print(log_entry)
-        self.log_file.write(log_entry + '\n')
-        self.log_file.flush()
+        with self._log_lock:
+            print(log_entry)
+            self.log_file.write(log_entry + '\n')
+            self.log_file.flush()
 
     # ---------- 1. 数据库管理 ----------
     def connect_db(self):
-        """建立并返回数据库连接。"""
+        """返回本次运行共用的数据库连接，首次调用时建立连接并设置 PRAGMA。"""
+        if self.conn is not None:
+            return self.conn
         db_dir = os.path.dirname(self.db_path)
         if not os.path.exists(db_dir):
             os.makedirs(db_dir)
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        pragmas = {**DEFAULT_SQLITE_PRAGMAS, **self.cfg.get("sqlite_pragmas", {})}
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        self.conn = conn
         return conn
 
+    def close_db(self):
+        """关闭共用连接。"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    @contextmanager
+    def transaction(self):
+        """
+        在共用连接上开启一个写事务（BEGIN IMMEDIATE），正常结束时提交，异常时回滚。
+        嵌套调用时复用外层事务，由最外层负责提交。
+        抓取线程和入库线程共用同一连接，事务期间持有 _db_lock，避免两个线程的写入混进同一事务。
+        事务外的读取也要持有 _db_lock（见 get_state），不与另一线程的事务交错使用同一连接。
+        """
+        with self._db_lock:
+            conn = self.connect_db()
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
     def init_db(self):
-        """初始化数据库，并确保商品表存在（包含 miss_count）。"""
+        """初始化数据库，并确保商品表、运行记录表和 outbox 表存在。"""
         conn = self.connect_db()
         cursor = conn.cursor()
         cursor.execute(f"""
@@ -92,280 +208,967 @@ class CoreScraper:
             size TEXT,
             is_active INTEGER DEFAULT 1, 
             last_seen TEXT,
-            miss_count INTEGER DEFAULT 0
+            miss_count INTEGER DEFAULT 0,
+            last_seen_gen INTEGER DEFAULT 0,
+            content_hash INTEGER,
+            page_no INTEGER
+        )
+        """)
+        # 每次运行一条记录；商品连续未出现的次数 = 当前代号 - last_seen_gen
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {self.runs_table} (
+            gen INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT,
+            finished_at TEXT,
+            product_count INTEGER,
+            deactivated INTEGER,
+            request_rates TEXT
+        )
+        """)
+        # 价格历史：只在价格变化时追加；整数分 + 整数时间戳，(sku_id, ts) 聚簇存储
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {self.history_table} (
+            sku_id TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            list_cents INTEGER,
+            sale_cents INTEGER,
+            PRIMARY KEY (sku_id, ts)
+        ) WITHOUT ROWID
+        """)
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {self.outbox_table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            endpoint TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TEXT,
+            sent_at TEXT
+        )
+        """)
+        cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{self.outbox_table}_due
+        ON {self.outbox_table} (status, next_attempt_at)
+        """)
+        # 分页检查点：每页最近一次抓取的结果；失败的页下次运行优先续抓
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {self.pages_table} (
+            page_no INTEGER PRIMARY KEY,
+            page_size INTEGER,
+            status TEXT NOT NULL,
+            gen INTEGER,
+            item_count INTEGER,
+            attempts INTEGER,
+            last_error TEXT,
+            updated_at TEXT
+        )
+        """)
+        # 站点级的键值状态（如试探出的每页商品数），值为 JSON
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {self.state_table} (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TEXT
         )
         """)
         conn.commit()
-        conn.close()
-        self.log(f"数据库 '{self.db_path}' 及表 '{self.table_name}' 初始化完成（含 miss_count）。")
+        self.log(f"数据库 '{self.db_path}' 及表 '{self.table_name}' 初始化完成。")
 
-    def migrate_database(self):
-        """为旧数据库添加 miss_count 字段（仅执行一次）"""
+    def get_state(self, key, default=None):
+        """读取站点状态表中的一个值。"""
+        with self._db_lock:
+            row = self.connect_db().execute(
+                f"SELECT value FROM {self.state_table} WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row['value']) if row else default
+
+    def set_state(self, key, value):
+        """写入站点状态表中的一个值（JSON 序列化）。"""
+        with self.transaction() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.state_table} (key, value, updated_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+
+    def _add_column(self, column, definition, table=None):
+        """字段不存在时为商品表（或指定的表）添加字段，返回是否新增。"""
         conn = self.connect_db()
-        cursor = conn.cursor()
         try:
-            cursor.execute(f"ALTER TABLE {self.table_name} ADD COLUMN miss_count INTEGER DEFAULT 0")
+            conn.execute(f"ALTER TABLE {table or self.table_name} ADD COLUMN {column} {definition}")
             conn.commit()
-            self.log("数据库迁移完成：已添加 miss_count 字段")
+            self.log(f"数据库迁移完成：已添加 {column} 字段")
+            return True
         except sqlite3.OperationalError as e:
-            if "duplicate column name" in str(e):
-                pass  # 字段已存在
-            else:
+            if "duplicate column name" not in str(e):
                 self.log(f"数据库迁移警告: {e}")
-        conn.close()
+            return False
+
+    def migrate_database(self):
+        """为旧数据库补齐新增字段和索引（仅执行一次）"""
+        conn = self.connect_db()
+        self._add_column("miss_count", "INTEGER DEFAULT 0")
+        if self._add_column("last_seen_gen", "INTEGER DEFAULT 0"):
+            # 旧数据：代号从 0 开始，last_seen_gen = -miss_count 保持已累计的未出现次数
+            conn.execute(f"UPDATE {self.table_name} SET last_seen_gen = -miss_count")
+            conn.commit()
+        self._add_column("content_hash", "INTEGER")  # 旧数据为 NULL，首次运行时整行写入并补上指纹
+        self._add_column("page_no", "INTEGER")  # 商品最近一次出现在第几页，用于部分抓取时的顺延
+        self._add_column("request_rates", "TEXT", table=self.runs_table)
+        conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{self.table_name}_active_gen
+        ON {self.table_name} (is_active, last_seen_gen)
+        """)
+        conn.commit()
+        if not self.get_state("price_history_seeded"):
+            # 价格历史表出现之前已有的商品没有任何历史：按库中现价补一条基线（时间取 last_seen），
+            # 否则第一次变价时只记下新价，看不出是从多少降下来的
+            with self.transaction() as conn:
+                seeded = conn.execute(f"""
+                    INSERT OR IGNORE INTO {self.history_table} (sku_id, ts, list_cents, sale_cents)
+                    SELECT sku_id, CAST(strftime('%s', COALESCE(last_seen, 'now'), 'utc') AS INTEGER),
+                           CAST(ROUND(list_price * 100) AS INTEGER), CAST(ROUND(sale_price * 100) AS INTEGER)
+                    FROM {self.table_name} t
+                    WHERE NOT EXISTS (SELECT 1 FROM {self.history_table} h WHERE h.sku_id = t.sku_id)
+                """).rowcount
+            self.set_state("price_history_seeded", True)
+            if seeded:
+                self.log(f"数据库迁移完成：为 {seeded} 个已有商品补写价格历史基线")
+
+    def _start_generation(self, cursor):
+        """为本次运行在 runs 表中登记一个新代号（每次运行只登记一次）。"""
+        if self.current_gen is None:
+            cursor.execute(
+                f"INSERT INTO {self.runs_table} (started_at) VALUES (?)",
+                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),)
+            )
+            self.current_gen = cursor.lastrowid
+        return self.current_gen
 
     # ---------- 2. HTTP 请求 ----------
-    def _make_request(self, method, url, **kwargs):
-        """发起HTTP请求，如果配置了伪装浏览器，则自动使用 curl_cffi。"""
-        kwargs['headers'] = {**self.headers, **kwargs.get('headers', {})}
-        kwargs['cookies'] = {**self.cookies, **kwargs.get('cookies', {})}
+    def _limiter_for(self, url):
+        """
+        该 URL 所属域名的自适应限速器（进程内按域名共享）。
+        初始速率取 rate_limit.initial_rate，其次 requests_per_second，最后按 delay 换算；
+        rate_limit 中的其它键（min_rate、max_rate、increase、decrease、latency_target）传给 AdaptiveRateLimiter。
+        未配置 max_rate 时最多升到初始速率的 2 倍，不会从原来 1-2 秒一次的节奏一路升到 10 请求/秒。
+        """
+        options = dict(self.cfg.get("rate_limit", {}))
+        delay = self.cfg.get("delay", 1)
+        rate = options.pop("initial_rate", None) or self.cfg.get("requests_per_second") or (1 / delay if delay else None)
+        if rate:
+            options.setdefault("max_rate", rate * 2)
+        limiter = get_domain_limiter(url, rate, burst=self.cfg.get("concurrency", 1), adaptive=options)
+        if limiter is not None:
+            self._limiters[urlparse(url).netloc] = limiter
+        return limiter
+
+    def request_rates(self):
+        """本爬虫用到的各域名当前请求速率（请求/秒）。"""
+        return {host: round(limiter.rate, 2) for host, limiter in self._limiters.items()}
+
+    def _make_request(self, method, url, rate_limit=True, **kwargs):
+        """
+        通过会话池发起HTTP请求，同一域名复用连接。
+        伪装浏览器、公共请求头和 Cookie 已在会话创建时设置，这里只传入本次请求额外的部分。
+        rate_limit 为 True 时请求前从域名限速器取令牌，请求后把状态码、耗时和 Retry-After 反馈给限速器；
+        超时、连接被重置等请求异常按 503 反馈，服务器扛不住时同样会降速。
+        """
         kwargs.setdefault('timeout', 20)
+        limiter = self._limiter_for(url) if rate_limit else None
+        if limiter is None:
+            return self.sessions.request(method, url, **kwargs)
 
-        if self.impersonate:
-            return requests.request(method, url, impersonate=self.impersonate, **kwargs)
-        else:
-            return requests.request(method, url, **kwargs)
+        limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = self.sessions.request(method, url, **kwargs)
+        except Exception:
+            limiter.record(503, time.monotonic() - start)
+            raise
+        limiter.record(response.status_code, time.monotonic() - start, response.headers.get("Retry-After"))
+        return response
+
+    def restore_cookies(self, url):
+        """从 Cookie 罐恢复该域名未过期的 Cookie。返回 False 表示没有可用 Cookie，需要走一次引导请求。"""
+        host = urlparse(url).netloc
+        cookies = self.cookie_store.get(host)
+        if not cookies:
+            return False
+        self.sessions.load_cookies(host, cookies)
+        self.log(f"🍪 复用已保存的 {len(cookies)} 个 Cookie，跳过引导请求。")
+        return True
+
+    def persist_cookies(self, url):
+        """
+        引导请求成功后，把会话里的 Cookie 写回 Cookie 罐，
+        并载入会话池（之后新建的会话和当前空闲会话都会带上），并发抓取的其它会话不会拿着空 Cookie 被拒绝。
+        """
+        host = urlparse(url).netloc
+        records = self.sessions.dump_cookies(host)
+        self.sessions.load_cookies(host, records)
+        count = self.cookie_store.save(host, records)
+        self.log(f"🍪 已保存 {count} 个 Cookie。")
+
+    def invalidate_cookies(self, url):
+        """服务端拒绝（401/403）时清空该域名的 Cookie，下次请求前重新引导。"""
+        host = urlparse(url).netloc
+        self.sessions.clear_cookies(host)
+        self.cookie_store.clear(host)
+
+    def refresh_cookies_once(self, url, bootstrap):
+        """
+        服务端拒绝（401/403）时清空该域名的 Cookie 并调用 bootstrap() 重新引导；本次运行只引导一次，
+        并发的页面共用引导结果。本次运行已引导过（含开头的引导请求）时返回 False。
+        """
+        with self._bootstrap_lock:
+            if self._crawl["bootstrapped"]:
+                return False
+            self.log("⚠️ Cookie失效，重新引导获取Cookie...")
+            self.invalidate_cookies(url)
+            self._crawl["bootstrapped"] = True
+            bootstrap()
+            return True
+
+    def fetch_with_cookie_refresh(self, page_no, fetch, url, bootstrap):
+        """调用 fetch() 抓取一页，返回 None（被拒绝）时按 refresh_cookies_once 重新引导后再试一次，仍被拒绝则抛出异常。"""
+        result = fetch()
+        if result is None:
+            self.refresh_cookies_once(url, bootstrap)
+            result = fetch()
+            if result is None:
+                raise PermissionError(f"第 {page_no} 页API拒绝访问 (401/403)")
+        return result
 
     # ---------- 3. 数据抓取 ----------
-    def fetch_data(self):
-        """主数据抓取方法。"""
-        all_products = []
+    def resume_page(self, page_size=None):
+        """
+        返回本次应开始抓取的页码：上次运行有失败的页（且每页条数未变）时从最早失败的页续抓，否则为 1。
+        同一页连续两次续抓都失败时不再续抓，从第 1 页重新开始，避免永远只抓后半部分。
+        """
+        with self._db_lock:
+            row = self.connect_db().execute(
+                f"SELECT MIN(page_no) FROM {self.pages_table} WHERE status = 'failed' AND page_size IS ?",
+                (page_size,)
+            ).fetchone()
+        page = row[0]
+        if page is None or page <= 1 or self.get_state("resumed_from") == page:
+            self.set_state("resumed_from", None)
+            return 1
+        self.set_state("resumed_from", page)
+        self._crawl["resumed"] = True
+        self.log(f"⏩ 上次运行在第 {page} 页中断，本次从该页继续抓取。")
+        return page
+
+    def checkpoint_page_failed(self, page_no, attempts, error, page_size=None):
+        """记录某页最终抓取失败：本次运行按部分抓取收尾，下次运行从该页续抓。"""
+        self._crawl["failed"] = True
+        with self.transaction() as conn:
+            gen = self._start_generation(conn.cursor())
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.pages_table} "
+                f"(page_no, page_size, status, gen, item_count, attempts, last_error, updated_at) "
+                f"VALUES (?, ?, 'failed', ?, 0, ?, ?, ?)",
+                (page_no, page_size, gen, attempts, str(error)[:500],
+                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+
+    def fetch_page_with_retry(self, page_no, fetch, page_size=None, stop=None):
+        """
+        调用 fetch() 抓取一页，失败时按指数退避（page_backoff 秒起，带抖动）重试，最多 page_retries 次。
+        全部失败时记录检查点并抛出最后一次的异常。
+        并发抓取时传入 stop（threading.Event）：翻页已结束（stop 被设置）时不再重试，直接抛出；
+        此时不在这里记录检查点，而由调用方按页码顺序确认该页没有超出目录末尾后再记录。
+        """
+        retries = self.cfg.get("page_retries", 3)
+        backoff = self.cfg.get("page_backoff", 2)
+        for attempt in range(1, retries + 1):
+            try:
+                return fetch()
+            except Exception as e:
+                if stop is not None and stop.is_set():
+                    raise
+                if attempt >= retries:
+                    if stop is None:
+                        self.checkpoint_page_failed(page_no, attempt, e, page_size)
+                    raise
+                wait = backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                self.log(f"⚠️ 第 {page_no} 页第 {attempt} 次抓取失败: {e}，{wait:.1f}s 后重试")
+                if stop is None:
+                    time.sleep(wait)
+                elif stop.wait(wait):
+                    raise
+
+    def tuned_page_size(self, default, probe_page):
+        """
+        返回本站点应使用的每页商品数。未配置 page_size_probe 时直接返回 default。
+        配置后按 candidates 从大到小试探，取第一个被服务端完整执行的值
+        （第 1 页返回条数等于每页条数，或商品总数不足一页时等于总数），
+        结果缓存在状态表中，ttl_hours（默认 24）小时后重新试探。
+        probe_page(size) 以该每页条数抓取第 1 页，返回 (该页结果, 返回条数, 商品总数)；
+        被接受的那一页结果留给正式抓取（见 probed_page），第 1 页不会再请求一次。
+        """
+        options = self.cfg.get("page_size_probe")
+        if not options:
+            return default
+        cached = self.get_state("page_size")
+        ttl = options.get("ttl_hours", 24) * 3600
+        if cached and cached.get("default") == default and time.time() - cached["probed_at"] < ttl:
+            return cached["page_size"]
+
+        page_size = default
+        errors = 0
+        for size in sorted(set(options.get("candidates", [])), reverse=True):
+            if size <= default:
+                break
+            try:
+                result, returned, total = probe_page(size)
+            except Exception as e:
+                errors += 1
+                self.log(f"试探每页 {size} 条失败: {e}")
+                continue
+            if returned == size or (total and returned == total and total < size):
+                page_size = size
+                self._probed_pages[(1, size)] = result
+                break
+            self.log(f"每页 {size} 条未被服务端接受（返回 {returned} 条，商品总数 {total}）")
+
+        self.log(f"📐 每页商品数试探结果: {page_size}（配置值 {default}）")
+        if page_size != default or not errors:
+            # 全部因网络错误失败时不缓存，下次运行再试
+            self.set_state("page_size", {"page_size": page_size, "default": default, "probed_at": time.time()})
+        return page_size
+
+    def probed_page(self, page_no, page_size):
+        """取出每页条数试探时已抓取的该页结果（只能取一次）；没有时返回 None，由调用方正常请求。"""
+        return self._probed_pages.pop((page_no, page_size), None)
+
+    def _request_page(self, page, page_size=None):
+        """JSON API 路径：按 payload_template 请求一页，返回响应 JSON。"""
+        # 深拷贝，避免并发抓取时多个线程同时修改同一个 variables 字典
+        payload = copy.deepcopy(self.payload_template)
+        if "variables" in payload:
+            payload["variables"]["page"] = page
+            if page_size:
+                payload["variables"]["pageSize"] = page_size
+        response = self._make_request("POST", self.api_url, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def _probe_page(self, size):
+        """以指定每页条数抓取第 1 页，返回 (商品列表, 返回条数, 商品总数)，供 tuned_page_size 试探使用。"""
+        data = self._request_page(1, size)
+        products = self.parse_data(data, self.base_url)
+        return products, len(products), data.get("data", {}).get("categoryPageData", {}).get("results") or 0
+
+    def parse_html_products(self, html_text):
+        """在当前线程按 extraction 规则解析页面HTML，返回商品列表。解析期间没有下载可以重叠时用它，不经过解析进程池。"""
+        return self.extraction.extract(html_text, self.base_url, log=self.log)
+
+    def submit_parse(self, html_text):
+        """
+        按 extraction 规则解析页面HTML，返回结果为商品列表的 Future。
+        启用了解析进程池时交给池中的进程解析，否则在当前线程解析，返回已完成的 Future。
+        只在解析期间有下一页的下载可以重叠时使用：调用方应先发起下一页的下载，再调用 .result()
+        （见 _fetch_pages_concurrently）；否则进程间传递的开销得不到任何回报，应改用 parse_html_products。
+        """
+        if self.parse_pool is None:
+            return completed(self.parse_html_products(html_text))
+        return self.parse_pool.submit(
+            extract_products, self.cfg["extraction"], html_text, self.base_url, self.price_locale
+        )
+
+    def _request_html_page(self, page, page_size=None):
+        """
+        通用HTML路径：GET api_url，按 pagination.page_param / page_size_param 传页码和每页条数，
+        payload_template 作为其余查询参数；返回页面HTML。
+        """
+        pagination = self.cfg.get("pagination", {})
+        params = dict(self.payload_template)
+        if pagination.get("page_param"):
+            params[pagination["page_param"]] = page
+        if page_size and pagination.get("page_size_param"):
+            params[pagination["page_size_param"]] = page_size
+        response = self._make_request(self.cfg.get("request_method", "GET"), self.api_url, params=params)
+        response.raise_for_status()
+        return response.text
+
+    def _fetch_html_page(self, page, page_size=None):
+        """抓取HTML路径的一页，返回结果为商品列表的 Future（见 submit_parse），由 _fetch_pages_concurrently 与下一页的下载重叠。"""
+        return self.submit_parse(self._request_html_page(page, page_size))
+
+    def _probe_html_page(self, size):
+        """HTML路径的每页条数试探：页面不提供商品总数，只按返回条数判断。试探时没有其它下载，直接在当前线程解析。"""
+        products = self.parse_html_products(self._request_html_page(1, size))
+        return products, len(products), 0
+
+    def _fetch_page(self, page):
+        """抓取并解析单页，返回该页的商品列表（HTML路径返回结果为商品列表的 Future）；试探时已抓过的页直接复用。"""
+        probed = self.probed_page(page, self.page_size)
+        if probed is not None:
+            return probed
+        if self.extraction is not None:
+            return self._fetch_html_page(page, self.page_size)
+        return self.parse_data(self._request_page(page, self.page_size), self.base_url)
+
+    def fetch_batches(self):
+        """
+        主数据抓取方法（生成器），逐页产出 (页码, 该页商品列表)，run() 在抓取过程中逐批比较和入库。
+        配置了 concurrency > 1 时并发抓取；配置了 extraction 时走通用HTML路径（见 _fetch_html_page）。
+        """
         max_pages = self.cfg.get("pagination", {}).get("max_pages", 1)
-        for page in range(1, max_pages + 1):
+        concurrency = self.cfg.get("concurrency", 1)
+
+        if self.extraction is not None:
+            pagination = self.cfg.get("pagination", {})
+            default_size = pagination.get("page_size") if pagination.get("page_size_param") else None
+            probe_page = self._probe_html_page
+        else:
+            default_size = self.payload_template.get("variables", {}).get("pageSize")
+            probe_page = self._probe_page
+        if default_size:
+            self.page_size = self.tuned_page_size(default_size, probe_page)
+            # 每页条数变大后按相同的商品覆盖量重新计算最大页数
+            max_pages = -(-max_pages * default_size // self.page_size)
+        start_page = self.resume_page(self.page_size)
+        if concurrency > 1 or self.extraction is not None:
+            # HTML路径即使不并发也走这里：本页在解析进程池中解析时，下一页已经开始下载
+            yield from self._fetch_pages_concurrently(max_pages, concurrency, start_page)
+            return
+
+        for page in range(start_page, max_pages + 1):
             self.log(f"正在抓取第 {page}/{max_pages} 页...")
-            payload = self.payload_template.copy()
-            if "variables" in payload:
-                payload["variables"]["page"] = page
             try:
-                response = self._make_request("POST", self.api_url, json=payload)
-                response.raise_for_status()
-                page_products = self.parse_data(response.json(), self.base_url)
+                page_products = self.fetch_page_with_retry(
+                    page, lambda: self._fetch_page(page), self.page_size
+                )
                 if not page_products:
                     self.log("当前页未发现商品，停止翻页。")
                     break
-                all_products.extend(page_products)
-                time.sleep(self.cfg.get("delay", 1))
             except Exception as e:
                 self.log(f"抓取第 {page} 页失败: {e}")
                 break
-        return all_products
+            yield page, page_products
+
+    def _fetch_pages_concurrently(self, max_pages, concurrency, start_page=1, fetch_page=None, window=None):
+        """
+        滑动窗口并发抓取：最多 concurrency 个页面同时在途，按页码顺序逐页产出结果。
+        window 为提前排队的页数（默认等于 concurrency）；已知总页数时传入全部剩余页数，
+        所有页面一次排好，抓取不再等待调用方消费上一页。
+        fetch_page(page) 返回该页商品列表，默认为 self._fetch_page；也可以返回结果为商品列表的 Future
+        （解析交给了解析进程池），此时下载一完成就补位下一页，下载与上一页的解析重叠，结果仍按页码顺序产出。
+        某页为空或失败时停止翻页，并取消其后尚未开始的页面；仍在重试的页面不再重试。
+        失败页按页码顺序确认后才记录检查点：第一个空页之后的页面已超出目录末尾，它们的失败直接丢弃，
+        不会把本次运行记为部分抓取，也不会让下次运行从不存在的页面续抓。
+        """
+        stop = threading.Event()
+        fetch_page = fetch_page or self._fetch_page
+        window = max(window or concurrency, 1)
+
+        def task(page):
+            if stop.is_set():
+                return None
+            self.log(f"正在抓取第 {page}/{max_pages} 页 (并发)...")
+            return self.fetch_page_with_retry(page, lambda: fetch_page(page), self.page_size, stop)
+
+        self.log(f"并发抓取模式：并发数 {concurrency}，"
+                 f"初始限速 {self.cfg.get('requests_per_second') or '自适应'} 请求/秒")
+        pending = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            try:
+                next_page = start_page
+                while next_page <= min(start_page + window - 1, max_pages):
+                    pending[next_page] = executor.submit(task, next_page)
+                    next_page += 1
+
+                for page in range(start_page, max_pages + 1):
+                    future = pending.pop(page)
+                    refilled = False
+                    attempts = self.cfg.get("page_retries", 3)
+                    try:
+                        page_products = future.result()
+                        if isinstance(page_products, Future):
+                            # 本页已下载完、正在解析：先补位下一页，再等待解析结果
+                            if next_page <= max_pages:
+                                pending[next_page] = executor.submit(task, next_page)
+                                next_page += 1
+                            refilled = True
+                            attempts = 1
+                            page_products = page_products.result()
+                    except Exception as e:
+                        # 按页码顺序走到这里，说明之前的页都不为空：该页仍在目录范围内，记为失败页
+                        self.log(f"抓取第 {page} 页失败: {e}")
+                        self.checkpoint_page_failed(page, attempts, e, self.page_size)
+                        break
+                    if not page_products:
+                        self.log(f"第 {page} 页未发现商品，停止翻页。")
+                        break
+                    if not refilled and next_page <= max_pages:
+                        pending[next_page] = executor.submit(task, next_page)
+                        next_page += 1
+                    yield page, page_products
+            finally:
+                # 取消最后一个非空页之后仍在排队的页面，已在途的结果直接丢弃（调用方提前停止时同样适用）
+                stop.set()
+                for future in pending.values():
+                    future.cancel()
 
     # ---------- 4. 数据解析 ----------
     def parse_data(self, data, base_url):
         """解析原始JSON数据，并根据配置附加URL后缀。"""
         try:
             items = data.get("data", {}).get("categoryPageData", {}).get("products", [])
-            products = []
+            products = ProductBatch()
             for item in items:
                 pdp_url = item.get("pdpUrl", "")
                 full_url = urljoin(base_url, pdp_url) if base_url and pdp_url else pdp_url
                 if self.cfg.get("url_suffix"):
                     full_url += self.cfg.get("url_suffix")
-                
-                def clean_price(price_val):
-                    if isinstance(price_val, list) and price_val: price_val = price_val[0]
-                    try: return float(str(price_val).replace('$', '').replace('CA', '').strip())
-                    except (ValueError, TypeError): return 0.0
-
-                list_price = clean_price(item.get("listPrice"))
-                sale_price = clean_price(item.get("productSalePrice") or item.get("salePrice"))
+
+                list_price = parse_price(item.get("listPrice"), self.price_locale) or 0.0
+                sale_price = parse_price(item.get("productSalePrice") or item.get("salePrice"), self.price_locale) or 0.0
                 discount = round((1 - sale_price / list_price) * 100) if list_price and sale_price and list_price > sale_price else 0
 
-                products.append({
-                    "sku_id": item.get("productId"), 
-                    "product_id": item.get("productId"), 
-                    "name": item.get("displayName"), 
-                    "url": full_url,
-                    "image_url": item.get("swatches", [{}])[0].get("primaryImage"), 
-                    "list_price": list_price, 
-                    "sale_price": sale_price if sale_price else list_price,  # 默认使用 list_price
-                    "discount_percentage": discount, 
-                    "color": None, 
-                    "size": None
-                })
+                products.append(
+                    sku_id=item.get("productId"),
+                    product_id=item.get("productId"),
+                    name=item.get("displayName"),
+                    url=full_url,
+                    image_url=item.get("swatches", [{}])[0].get("primaryImage"),
+                    list_price=list_price,
+                    sale_price=sale_price if sale_price else list_price,  # 默认使用 list_price
+                    discount_percentage=discount,
+                )
             return products
         except Exception as e:
             self.log(f"解析数据出错: {e}")
-            return []
+            return ProductBatch()
 
     # ---------- 5. 通知逻辑 ----------
+    def _post_bark(self, bark_url, payload):
+        """向单个 Bark 设备发送一条推送。"""
+        return self._make_request("POST", bark_url, json=payload, timeout=10, rate_limit=False)
+
     def send_bark_notification(self, title, body, url, image_url):
-        """通过 Bark 发送通知。"""
+        """
+        登记一条 Bark 通知：每台设备一条记录，先暂存在内存中，
+        由 _process_batch 在写入本批商品的同一事务里写入 outbox 表，提交后再投递。
+        """
         self.log(f"    -> 准备发送通知: {title}")
+        payload = {
+            "title": title, 
+            "body": body, 
+            "icon": self.icon_url, 
+            "url": url or "", 
+            "image": image_url or "", 
+            "group": self.site_name
+        }
         for bark_url in self.bark_urls:
-            try:
-                payload = {
-                    "title": title, 
-                    "body": body, 
-                    "icon": self.icon_url, 
-                    "url": url or "", 
-                    "image": image_url or "", 
-                    "group": self.site_name
-                }
-                self._make_request("POST", bark_url, json=payload, timeout=10)
-            except Exception as e:
-                self.log(f"    -> Bark 推送失败: {e}")
+            self._pending_alerts.append((bark_url, payload))
 
-    def check_and_notify(self, products):
-        """将抓取到的商品与数据库记录比较，并发送通知（含 miss_count 补货逻辑）。"""
-        conn = self.connect_db()
-        cursor = conn.cursor()
-        cursor.execute(f"""
-            SELECT sku_id, sale_price, is_active, miss_count 
-            FROM {self.table_name}
+    def _write_outbox(self, cursor):
+        """把暂存的通知写入 outbox 表（由调用方负责提交事务）。"""
+        if not self._pending_alerts:
+            return
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cursor.executemany(
+            f"INSERT INTO {self.outbox_table} (endpoint, payload, created_at) VALUES (?, ?, ?)",
+            [(bark_url, json.dumps(payload, ensure_ascii=False), now) for bark_url, payload in self._pending_alerts]
+        )
+        self.log(f"已写入 {len(self._pending_alerts)} 条待发送通知到 outbox")
+
+    def dispatch_notifications(self):
+        """把 outbox 中到期的通知交给推送线程池后立即返回（不等待结果），供入库线程在每批提交后调用。"""
+        if not self.outbox_inline_send:
+            return
+        try:
+            self.outbox.dispatch()
+        except Exception as e:
+            self.log(f"Outbox 投递出错: {e}")
+
+    def flush_notifications(self):
+        """
+        运行结束时在 notify_flush_timeout 截止时间内收尾：先等待抓取过程中已提交的推送，
+        再用剩余时间投递 outbox 中其余到期的通知；未送达的留给下次运行或独立发送循环重试。
+        """
+        if not self.outbox_inline_send:
+            return
+        deadline = time.monotonic() + self.notify_flush_timeout
+        try:
+            self.notifier.flush(self.notify_flush_timeout)
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                self.outbox.drain(remaining)
+        except Exception as e:
+            self.log(f"Outbox 投递出错: {e}")
+
+    def _load_scraped_batch(self, cursor, products):
+        """把本次抓取结果（ProductBatch）批量写入临时表 scraped，供比较时与商品表按主键连接。"""
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS scraped (
+                sku_id TEXT PRIMARY KEY,
+                name TEXT,
+                url TEXT,
+                image_url TEXT,
+                sale_price REAL,
+                discount_percentage REAL
+            )
         """)
-        old_products = {
-            row['sku_id']: {
-                'sale_price': row['sale_price'], 
-                'is_active': row['is_active'],
-                'miss_count': row['miss_count']
-            } 
-            for row in cursor.fetchall()
-        }
-        conn.close()
-        
-        self.log(f"正在将 {len(products)} 个抓取商品与 {len(old_products)} 条数据库记录进行比较...")
-        
+        cursor.execute("DELETE FROM scraped")
+        cursor.executemany(
+            "INSERT OR REPLACE INTO scraped VALUES (?, ?, ?, ?, ?, ?)",
+            # sale_price 在入批时已用 list_price 补齐
+            products.rows("sku_id", "name", "url", "image_url", "sale_price", "discount_percentage")
+        )
+
+    def check_and_notify(self, products):
+        """
+        将抓取到的商品与数据库记录比较，并发送通知（含补货逻辑）。
+        抓取结果先载入临时表，再用一次主键连接找出新品/降价/补货，
+        开销只与本次抓取量有关，与历史 SKU 总数无关。
+        products 可以是 ProductBatch 或商品字典列表。
+        """
+        products = ProductBatch.of(products)
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            gen = self._start_generation(cursor)
+            self._load_scraped_batch(cursor, products)
+            # scraped 作为外表（LEFT JOIN 固定连接顺序），逐行按商品表主键查找；
+            # 本次运行之前已连续未出现的次数 = (gen - 1) - last_seen_gen
+            cursor.execute(f"""
+                SELECT s.sku_id, s.name, s.url, s.image_url, s.sale_price, s.discount_percentage,
+                       t.sale_price AS old_price,
+                       CASE
+                           WHEN t.sku_id IS NULL THEN 'new'
+                           WHEN t.sale_price IS NOT NULL AND s.sale_price < t.sale_price THEN 'drop'
+                           WHEN t.is_active = 0 AND t.last_seen_gen <= :gen - 4 THEN 'restock'
+                       END AS change_type
+                FROM scraped s
+                LEFT JOIN {self.table_name} t ON t.sku_id = s.sku_id
+                WHERE t.sku_id IS NULL
+                   OR (t.sale_price IS NOT NULL AND s.sale_price < t.sale_price)
+                   OR (t.is_active = 0 AND t.last_seen_gen <= :gen - 4)
+                ORDER BY s.rowid
+            """, {"gen": gen})
+            changes = cursor.fetchall()
+
+        self.log(f"正在比较 {len(products)} 个抓取商品，发现 {len(changes)} 个变化...")
+
         stats = {"new": 0, "drop": 0, "restock": 0, "high_discount": 0}
 
-        for p in products:
-            sku_id, name, sale_price = p["sku_id"], p["name"], p["sale_price"]
-            old_p = old_products.get(sku_id)
-            
-            # 确保 sale_price 不是 None
-            if sale_price is None:
-                sale_price = p.get("list_price", 0.0)
+        for row in changes:
+            name, sale_price, change_type = row["name"], row["sale_price"], row["change_type"]
 
             # 1. 新品
-            if not old_p:
+            if change_type == "new":
                 self.send_bark_notification(
                     f"【{self.site_name}】新品上架", 
                     f"{name}\n价格: ${sale_price}", 
-                    p["url"], 
-                    p["image_url"]
+                    row["url"], 
+                    row["image_url"]
                 )
-                stats["new"] += 1
 
             # 2. 降价
-            elif old_p and old_p['sale_price'] is not None and sale_price < old_p['sale_price']:
+            elif change_type == "drop":
                 self.send_bark_notification(
                     f"【{self.site_name}】商品降价", 
-                    f"{name}\n现价 ${sale_price} (原价 ${old_p['sale_price']})", 
-                    p["url"], 
-                    p["image_url"]
+                    f"{name}\n现价 ${sale_price} (原价 ${row['old_price']})", 
+                    row["url"], 
+                    row["image_url"]
                 )
-                stats["drop"] += 1
 
-            # 3. 重新上架（仅 miss_count >= 3 才通知，避免频繁）
-            elif old_p and not old_p['is_active'] and old_p['miss_count'] >= 3:
+            # 3. 重新上架（仅连续未出现 >= 3 次才通知，避免频繁）
+            elif change_type == "restock":
                 self.send_bark_notification(
                     f"【{self.site_name}】重新上架", 
                     f"{name}\n价格: ${sale_price}", 
-                    p["url"], 
-                    p["image_url"]
+                    row["url"], 
+                    row["image_url"]
                 )
-                stats["restock"] += 1
+            stats[change_type] += 1
 
             # 4. 超高折扣（仅对新品或降价商品发）
-            discount = p.get("discount_percentage", 0)
-            if discount > self.discount_threshold:
-                if not old_p or (old_p['sale_price'] is not None and sale_price < old_p.get('sale_price', float('inf'))):
-                    self.send_bark_notification(
-                        f"【{self.site_name}】超高折扣!", 
-                        f"{discount}% OFF - {name}\n价格: ${sale_price}", 
-                        p["url"], 
-                        p["image_url"]
-                    )
-                    stats["high_discount"] += 1
+            discount = row["discount_percentage"] or 0
+            if discount > self.discount_threshold and change_type in ("new", "drop"):
+                self.send_bark_notification(
+                    f"【{self.site_name}】超高折扣!", 
+                    f"{discount}% OFF - {name}\n价格: ${sale_price}", 
+                    row["url"], 
+                    row["image_url"]
+                )
+                stats["high_discount"] += 1
 
         self.log(f"通知统计 → 新品: {stats['new']} | 降价: {stats['drop']} | 补货: {stats['restock']} | 高折扣: {stats['high_discount']}")
 
     # ---------- 6. 数据库更新 ----------
-    def update_database(self, products):
-        """保存商品数据，更新 miss_count，并标记长期未出现商品。"""
-        conn = self.connect_db()
-        cursor = conn.cursor()
+    def _load_existing(self, cursor, hashed):
+        """
+        读取本次抓取商品在数据库中的现有记录。
+        返回 {sku_id: (内容指纹是否一致, 原价, 现价)}，仅包含已存在的商品。
+        """
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS scraped_hashes (
+                sku_id TEXT PRIMARY KEY,
+                content_hash INTEGER
+            )
+        """)
+        cursor.execute("DELETE FROM scraped_hashes")
+        cursor.executemany("INSERT OR REPLACE INTO scraped_hashes VALUES (?, ?)", hashed)
+        cursor.execute(f"""
+            SELECT h.sku_id, t.content_hash IS h.content_hash, t.list_price, t.sale_price
+            FROM scraped_hashes h
+            CROSS JOIN {self.table_name} t ON t.sku_id = h.sku_id
+        """)
+        return {row[0]: (bool(row[1]), row[2], row[3]) for row in cursor.fetchall()}
+
+    def _upsert_batch(self, cursor, products, page_no=None):
+        """写入一批抓取到的商品（ProductBatch），并记下它们所在的页码（由调用方负责事务）。"""
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # 1. 所有活跃商品 miss_count +1
-        cursor.execute(f"UPDATE {self.table_name} SET miss_count = miss_count + 1 WHERE is_active = 1")
-        
-        # 2. 更新本次抓取的商品（miss_count = 0, is_active = 1）
-        update_data = []
-        for p in products:
-            # 确保 sale_price 有默认值
-            if p["sale_price"] is None:
-                p["sale_price"] = p.get("list_price", 0.0)
-            update_data.append((
-                p["sku_id"], p["product_id"], p["name"], p["url"], p["image_url"], 
-                p["list_price"], p["sale_price"], p["discount_percentage"], 
-                p["color"], p["size"], 1, now, 0  # is_active=1, miss_count=0
-            ))
-        
-        if update_data:
+        gen = self._start_generation(cursor)
+        hashes = list(map(content_hash_values, products.rows(*CONTENT_FIELDS)))
+        existing = self._load_existing(cursor, zip(products.sku_id, hashes))
+
+        # 1. 内容有变化（或新出现）的商品整行写入（last_seen_gen = 本次代号, is_active = 1）
+        # 只记下行号，写库时再按列取值，不为每个商品构造整行元组的中间列表
+        changed = []
+        touched = []
+        history_data = {}  # 同一批中重复出现的 SKU 只记一条
+        ts = int(time.time())
+        list_prices, sale_prices = products.list_price, products.sale_price
+        for i, sku_id in enumerate(products.sku_id):
+            old = existing.get(sku_id)
+            if old and old[0]:
+                touched.append(sku_id)
+                continue
+            list_cents, sale_cents = to_cents(list_prices[i]), to_cents(sale_prices[i])
+            if not old or (to_cents(old[1]), to_cents(old[2])) != (list_cents, sale_cents):
+                history_data[sku_id] = (sku_id, ts, list_cents, sale_cents)
+            changed.append(i)
+
+        if changed:
+            columns = [getattr(products, field) for field in PRODUCT_FIELDS]
+            update_data = (
+                (*(column[i] for column in columns), 1, now, gen, hashes[i], page_no)  # is_active=1
+                for i in changed
+            )
             cursor.executemany(f"""
                 INSERT INTO {self.table_name} 
                 (sku_id, product_id, name, url, image_url, list_price, sale_price, 
-                 discount_percentage, color, size, is_active, last_seen, miss_count)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 discount_percentage, color, size, is_active, last_seen, last_seen_gen, content_hash, page_no)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(sku_id) DO UPDATE SET
                     name=excluded.name, url=excluded.url, image_url=excluded.image_url, 
                     list_price=excluded.list_price, sale_price=excluded.sale_price,
                     discount_percentage=excluded.discount_percentage, color=excluded.color, 
                     size=excluded.size, is_active=excluded.is_active, 
-                    last_seen=excluded.last_seen, miss_count=excluded.miss_count
+                    last_seen=excluded.last_seen, last_seen_gen=excluded.last_seen_gen,
+                    content_hash=excluded.content_hash, page_no=excluded.page_no
             """, update_data)
-        
-        # 3. miss_count >= 80 → is_active = 0
+
+        # 内容未变的商品只做轻量刷新
+        if touched:
+            cursor.executemany(
+                f"UPDATE {self.table_name} SET last_seen = ?, last_seen_gen = ?, is_active = 1, page_no = ? "
+                f"WHERE sku_id = ?",
+                ((now, gen, page_no, sku_id) for sku_id in touched)
+            )
+        # 价格有变化（含首次出现）的商品追加一条价格历史
+        # 同一秒内再次变价时顺延到该 SKU 最后一条记录的下一秒，不覆盖已有记录
+        if history_data:
+            cursor.executemany(
+                f"INSERT INTO {self.history_table} (sku_id, ts, list_cents, sale_cents) "
+                f"VALUES (?1, MAX(?2, COALESCE((SELECT MAX(ts) FROM {self.history_table} WHERE sku_id = ?1) + 1, 0)), ?3, ?4)",
+                history_data.values()
+            )
+        self.log(f"写入统计 → 整行写入: {len(changed)} | 仅刷新: {len(touched)} | 价格变动: {len(history_data)}")
+
+    def _sweep(self, cursor, product_count):
+        """
+        全部批次入库之后的收尾：标记长期未出现商品并记录本次运行（由调用方负责事务）。
+        连续 80 次未出现 → is_active = 0（走 (is_active, last_seen_gen) 索引）。
+        """
+        gen = self._start_generation(cursor)
+        fetched = sorted(self._crawl["fetched"])
+        if self._crawl["failed"] or self._crawl["resumed"]:
+            # 部分抓取：没抓到的页上的商品把 last_seen_gen 顺延一代，未出现次数保持不变，避免误判下架
+            not_fetched = "1"
+            if fetched:
+                not_fetched = f"page_no IS NULL OR page_no NOT IN ({','.join('?' * len(fetched))})"
+            carried = cursor.execute(
+                f"UPDATE {self.table_name} SET last_seen_gen = last_seen_gen + 1 "
+                f"WHERE last_seen_gen < ? AND ({not_fetched})",
+                (gen, *fetched)
+            ).rowcount
+            self.log(f"本次为部分抓取（已抓 {len(fetched)} 页），{carried} 个未抓到页上的商品顺延未出现计数。")
+        else:
+            # 完整抓取：本次没有访问到的页（目录变短）不再保留检查点
+            cursor.execute(f"DELETE FROM {self.pages_table} WHERE gen IS NOT ?", (gen,))
         inactive_count = cursor.execute(
-            f"UPDATE {self.table_name} SET is_active = 0 WHERE miss_count >= 80 AND is_active = 1"
+            f"UPDATE {self.table_name} SET is_active = 0 WHERE is_active = 1 AND last_seen_gen <= ?",
+            (gen - 80,)
         ).rowcount
         if inactive_count > 0:
-            self.log(f"标记 {inactive_count} 个长期未出现商品为不活跃（miss_count >= 80）")
+            self.log(f"标记 {inactive_count} 个长期未出现商品为不活跃（连续 80 次未出现）")
 
-        conn.commit()
-        conn.close()
-        self.log(f"数据库已更新。本次活跃商品: {len(products)} 个")
+        cursor.execute(
+            f"UPDATE {self.runs_table} SET finished_at = ?, product_count = ?, deactivated = ?, request_rates = ? "
+            f"WHERE gen = ?",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), product_count, inactive_count,
+             json.dumps(self.request_rates()), gen)
+        )
+        return inactive_count
+
+    def get_price_history(self, sku_id, since=None, limit=None):
+        """
+        查询某个 SKU 的价格序列（按时间升序），直接走 (sku_id, ts) 主键范围扫描。
+        since 为起始时间（epoch 秒或 datetime），返回 [{"ts", "list_price", "sale_price"}, ...]。
+        """
+        if isinstance(since, datetime):
+            since = int(since.timestamp())
+        base = f"SELECT ts, list_cents, sale_cents FROM {self.history_table} WHERE sku_id = ? AND ts >= ?"
+        params = [sku_id, since or 0]
+        if limit:
+            # 取最近的 limit 条，再按时间升序返回
+            query = f"SELECT * FROM ({base} ORDER BY ts DESC LIMIT ?) ORDER BY ts"
+            params.append(limit)
+        else:
+            query = f"{base} ORDER BY ts"
+        with self._db_lock:
+            rows = self.connect_db().execute(query, params).fetchall()
+        return [
+            {
+                "ts": row["ts"],
+                "list_price": None if row["list_cents"] is None else row["list_cents"] / 100,
+                "sale_price": None if row["sale_cents"] is None else row["sale_cents"] / 100,
+            }
+            for row in rows
+        ]
 
     # ---------- 7. 主执行逻辑 ----------
+    def _process_batch(self, page_no, products, notify):
+        """
+        处理一页抓取结果：比较并登记通知、写入商品、写入 outbox，三者在同一个事务中提交；
+        提交后把本批通知交给推送线程池（不等待推送结果），不必等到最后一页抓完，入库也不受推送延迟拖累。
+        """
+        products = ProductBatch.of(products)
+        try:
+            with self.transaction() as conn:
+                if notify:
+                    self.check_and_notify(products)
+                cursor = conn.cursor()
+                self._upsert_batch(cursor, products, page_no)
+                self._write_outbox(cursor)
+                cursor.execute(
+                    f"INSERT OR REPLACE INTO {self.pages_table} "
+                    f"(page_no, page_size, status, gen, item_count, attempts, updated_at) "
+                    f"VALUES (?, ?, 'done', ?, ?, 1, ?)",
+                    (page_no, self.page_size, self.current_gen, len(products),
+                     datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                )
+                self._crawl["fetched"].add(page_no)
+                has_alerts = bool(self._pending_alerts)
+        finally:
+            self._pending_alerts = []
+        self.log(f"第 {page_no} 页的 {len(products)} 个商品已入库。")
+        if has_alerts:
+            self.dispatch_notifications()
+
+    def _run_pipeline(self, notify):
+        """
+        抓取与入库流水线：当前线程执行 fetch_batches（浏览器等线程相关资源留在调用线程），
+        每页结果经有界队列交给入库线程处理。返回入库的商品总数；入库出错时停止抓取并抛出异常。
+        """
+        batches = queue.Queue(maxsize=self.cfg.get("pipeline_depth", 4))
+        state = {"count": 0, "error": None}
+
+        def consume():
+            while True:
+                item = batches.get()
+                if item is None:
+                    return
+                if state["error"] is not None:
+                    continue
+                page_no, products = item
+                try:
+                    self._process_batch(page_no, products, notify)
+                    state["count"] += len(products)
+                except Exception as e:
+                    state["error"] = e
+
+        consumer = threading.Thread(target=consume, name=f"{self.table_name}-db", daemon=True)
+        consumer.start()
+        try:
+            for page_no, products in self.fetch_batches():
+                if state["error"] is not None:
+                    break
+                if products:
+                    batches.put((page_no, products))
+        finally:
+            batches.put(None)
+            consumer.join()
+        if state["error"] is not None:
+            raise state["error"]
+        return state["count"]
+
     def run(self):
         """爬虫的主运行循环，包含首次运行静默处理。"""
         self.log(f"\n{'='*20} 开始为 {self.site_name} 执行抓取任务 {'='*20}")
+        self.current_gen = None
+        self._crawl = {"fetched": set(), "failed": False, "resumed": False, "bootstrapped": False}
+        self._probed_pages = {}
         
         # 检查数据库是否已初始化
-        conn = self.connect_db()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT 1 FROM {self.table_name} LIMIT 1")
-        is_database_populated = cursor.fetchone() is not None
-        conn.close()
-        
-        products = self.fetch_data()
-        
-        if not products:
-            self.log("未抓取到任何商品，任务结束。")
-            self.log_file.close()
-            return
-
+        with self._db_lock:
+            is_database_populated = self.connect_db().execute(
+                f"SELECT 1 FROM {self.table_name} LIMIT 1"
+            ).fetchone() is not None
         if not is_database_populated:
             self.log("检测到首次运行或数据库为空 → 本次仅初始化数据，不发送通知。")
         else:
-            self.log("非首次运行 → 开始检查更新并发送通知...")
-            self.check_and_notify(products)
+            self.log("非首次运行 → 每页抓取后立即检查更新并发送通知...")
 
-        self.update_database(products)
+        product_count = self._run_pipeline(notify=is_database_populated)
+        
+        if not product_count:
+            self.log("未抓取到任何商品，任务结束。")
+            if self.current_gen is not None:
+                # 已记录了失败页（本次运行已占用一个代号）：照常收尾，让所有商品顺延未出现计数
+                with self.transaction() as conn:
+                    self._sweep(conn.cursor(), 0)
+            self.flush_notifications()  # 顺便重试之前未送达的通知
+            return
 
-        # 最终统计
-        conn = self.connect_db()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT COUNT(*) FROM {self.table_name}")
-        total = cursor.fetchone()[0]
-        cursor.execute(f"SELECT COUNT(*) FROM {self.table_name} WHERE is_active = 1")
-        active = cursor.fetchone()[0]
-        cursor.execute(f"SELECT COUNT(*) FROM {self.table_name} WHERE miss_count >= 80")
-        long_inactive = cursor.fetchone()[0]
-        conn.close()
+        # 所有批次入库后统一收尾：标记长期未出现商品、记录本次运行
+        with self.transaction() as conn:
+            self._sweep(conn.cursor(), product_count)
+        self.log(f"数据库已更新。本次活跃商品: {product_count} 个")
+
+        # 最终统计（推送回调可能正在写回 outbox，读取同样持有 _db_lock）
+        with self._db_lock:
+            cursor = self.connect_db().cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM {self.table_name}")
+            total = cursor.fetchone()[0]
+            cursor.execute(f"SELECT COUNT(*) FROM {self.table_name} WHERE is_active = 1")
+            active = cursor.fetchone()[0]
+            # is_active IN (0, 1) 让查询可以沿 (is_active, last_seen_gen) 索引做范围扫描
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {self.table_name} WHERE is_active IN (0, 1) AND last_seen_gen <= ?",
+                (self.current_gen - 80,)
+            )
+            long_inactive = cursor.fetchone()[0]
 
         self.log(f"{self.site_name} 任务成功结束！")
         self.log(f"   总SKU: {total} | 活跃: {active} | 长期未出现: {long_inactive}")
-        self.log(f"   本次抓取: {len(products)} 个商品")
-        self.log_file.close()
\ No newline at end of file
+        self.log(f"   本次抓取: {product_count} 个商品")
+        rates = self.request_rates()
+        if rates:
+            self.log("   当前请求速率: " + " | ".join(f"{host} {rate}/s" for host, rate in rates.items()))
+        self.flush_notifications()
+
+    def close(self):
+        """释放爬虫持有的资源（推送线程池、HTTP 会话、数据库连接、日志文件）。常驻模式下多次 run() 之间不调用。"""
+        self.notifier.close(self.notify_flush_timeout)
+        self.sessions.close()
+        self.close_db()
+        self.log_file.close()
@@ -0,0 +1,158 @@
+# 文件名: extraction.py
+
+import re
+from urllib.parse import urljoin
+
+from cssselect import HTMLTranslator
+from lxml import etree, html
+
+from price_parser import parse_price
+from product_batch import PRODUCT_FIELDS, ProductBatch
+
+_translator = HTMLTranslator()
+
+
+def parse_html(text):
+    """把 HTML 文本（完整页面或片段）解析成 lxml 文档；空内容返回 None。"""
+    if not text or not text.strip():
+        return None
+    try:
+        return html.document_fromstring(text)
+    except ValueError:
+        # 带 XML 编码声明的字符串 lxml 不接受，改用 UTF-8 字节解析
+        return html.document_fromstring(text.encode("utf-8"))
+
+
+class FieldSpec:
+    """
+    单个字段的抽取规则（配置中 extraction.fields 的一项）：
+      - css:      相对商品卡片的 CSS 选择器，取第一个匹配元素；省略时取卡片本身
+      - attr:     读取的属性名；省略时取元素文本（去掉首尾空白）
+      - regex:    对取到的值做正则匹配，有分组时取第 1 组
+      - type:     text（默认）/ url（按 base_url 拼成绝对地址）/ price（按 price_locale 解析为浮点数）/ int
+      - required: 为 true 时该字段为空的卡片整个跳过
+      - fallback: 该字段为空时改用另一个字段的值（如 product_id 回退到 sku_id）
+    选择器和取值方式在构造时一次性编译成 XPath 表达式。
+    """
+
+    def __init__(self, name, options, price_locale=None):
+        if isinstance(options, str):
+            options = {"css": options}
+        self.name = name
+        self.price_locale = price_locale
+        self.type = options.get("type", "text")
+        self.required = options.get("required", False)
+        self.fallback = options.get("fallback")
+        self.regex = re.compile(options["regex"]) if options.get("regex") else None
+
+        css = options.get("css")
+        attr = options.get("attr")
+        target = f"({_translator.css_to_xpath(css, prefix='descendant::')})[1]" if css else "."
+        if attr:
+            self.xpath = etree.XPath(f"string({target}/@{attr})")
+        else:
+            self.xpath = etree.XPath(f"string({target})")
+
+    def extract(self, tile, base_url):
+        value = self.xpath(tile).strip()
+        if value and self.regex is not None:
+            match = self.regex.search(value)
+            value = (match.group(1) if match.groups() else match.group(0)) if match else ""
+        if not value:
+            return None
+        if self.type == "url":
+            return urljoin(base_url, value) if base_url else value
+        if self.type == "price":
+            return parse_price(value, self.price_locale)
+        if self.type == "int":
+            digits = re.sub(r'[^\d]', '', value)
+            return int(digits) if digits else None
+        return str(value)
+
+
+class ExtractionSpec:
+    """
+    声明式的 HTML 商品抽取规则，来自站点配置的 extraction 项：
+        "extraction": {
+            "tile": "div.product-tile",
+            "fields": {"sku_id": {"attr": "data-itemid", "required": true}, ...},
+            "page": {"total_count": {"css": "p.toolbar-amount", "regex": "of\\s+(\\d+)", "type": "int"}}
+        }
+    tile 和各字段的 CSS 选择器只在构造时编译一次，之后直接在 lxml 文档上执行 XPath。
+    page 中的字段是页面级信息（相对整个文档取值），通过 ParsedPage.meta 读取。
+    价格字段按站点的 price_locale（如 "fr-CA"）解析，缺一个时互相补齐，并据此计算折扣。
+    """
+
+    def __init__(self, options, price_locale=None):
+        self.tile_xpath = etree.XPath(_translator.css_to_xpath(options["tile"]))
+        self.fields = [FieldSpec(name, field, price_locale) for name, field in options["fields"].items()]
+        self.page_fields = {name: FieldSpec(name, field) for name, field in options.get("page", {}).items()}
+
+    def tiles(self, doc):
+        return self.tile_xpath(doc) if doc is not None else []
+
+    def extract_tile(self, tile, base_url):
+        """抽取单个商品卡片，缺少必填字段时返回 None。"""
+        values = {}
+        for field in self.fields:
+            value = field.extract(tile, base_url)
+            if value is None and field.fallback:
+                value = values.get(field.fallback)
+            if value is None and field.required:
+                return None
+            values[field.name] = value
+
+        product = {field: values.get(field) for field in PRODUCT_FIELDS}
+        product["product_id"] = product["product_id"] or product["sku_id"]
+        sale_price = product["sale_price"] or product["list_price"] or 0.0
+        list_price = product["list_price"] or sale_price
+        product["sale_price"], product["list_price"] = sale_price, list_price
+        product["discount_percentage"] = round((1 - sale_price / list_price) * 100) if list_price > sale_price > 0 else 0
+        return product
+
+    def extract(self, doc, base_url, log=print):
+        """抽取文档中全部商品卡片，返回 ProductBatch；doc 可以是 HTML 文本或 parse_html 的结果。"""
+        if doc is None or isinstance(doc, (str, bytes)):
+            doc = parse_html(doc)
+        products = ProductBatch()
+        for tile in self.tiles(doc):
+            try:
+                product = self.extract_tile(tile, base_url)
+            except Exception as e:
+                log(f"⚠️ 解析单个商品时出错: {e}")
+                continue
+            if product is not None:
+                products.add(product)
+        return products
+
+
+class ParsedPage:
+    """
+    只解析一次的页面：商品卡片和页面级信息（商品总数等）都读取同一棵 lxml 文档树。
+    products 在第一次访问时抽取并缓存；空内容的页面 doc 为 None，products 为空批次。
+    """
+
+    def __init__(self, text, spec, base_url, log=print):
+        self.doc = parse_html(text)
+        self.spec = spec
+        self.base_url = base_url
+        self.log = log
+        self._products = None
+
+    @property
+    def products(self):
+        if self._products is None:
+            self._products = self.spec.extract(self.doc, self.base_url, log=self.log)
+        return self._products
+
+    def meta(self, name, default=None):
+        """读取 extraction.page 中定义的页面级字段，未定义或取不到时返回 default。"""
+        field = self.spec.page_fields.get(name)
+        if field is None or self.doc is None:
+            return default
+        value = field.extract(self.doc, self.base_url)
+        return default if value is None else value
+
+    @property
+    def total_count(self):
+        return self.meta("total_count", 0)
@@ -1,10 +1,37 @@
 # 文件名: lacordee_scraper.py
-from playwright.sync_api import sync_playwright
-import re
 import time
 import hashlib
 from urllib.parse import urljoin
+from browser_pool import close_browser_pool, get_browser_pool, iter_in_browser_thread
 from core_scraper import CoreScraper
+from page_waits import WaitStrategy
+from price_parser import parse_price
+from rate_limiter import get_domain_limiter
+
+BASE_DOMAIN = "https://www.lacordee.com"
+TILE_SELECTOR = 'article.item-root-Fmc'
+
+# 在页面内一次性提取所有商品卡片需要的字段，返回纯 JSON
+EXTRACT_TILES_JS = """
+(items) => items.map((item) => {
+    const text = (selector) => {
+        const el = item.querySelector(selector);
+        return el ? el.innerText.trim() : null;
+    };
+    const link = item.querySelector('a.item-name-YL8');
+    const swatch = item.querySelector('button.swatch-button-cZb[title]');
+    const img = item.querySelector('img[class*="item-imageLoaded"]') || item.querySelector('img');
+    return {
+        href: link ? link.getAttribute('href') : null,
+        name: text('h3'),
+        sale: text('span.price-specialPrice-6Lo'),
+        orig: text('span.price-normalPrice-zvG'),
+        color: text('dd'),
+        swatch: swatch ? swatch.getAttribute('title') : null,
+        img: img ? (img.getAttribute('src') || img.getAttribute('data-src')) : null,
+    };
+})
+"""
 
 class LaCordeeScraper(CoreScraper):
     def __init__(self, config_path):
@@ -12,22 +39,116 @@ class LaCordeeScraper(CoreScraper):
         self.search_url = self.cfg.get("search_url", "https://www.lacordee.com/en/search.html?query=Arcteryx")
         self.max_pages = self.cfg.get("max_pages", 5)
         self.delay = self.cfg.get("delay", 2)
-
-    def fetch_data(self):
-        products = []
+        self.waits = WaitStrategy(self.cfg.get("wait_strategy"), log=self.log)
+
+    def _build_product(self, tile, seen_variants):
+        """把 evaluate 返回的单个卡片原始字段转换为商品字典；重复变体返回 None。"""
+        # 1. 提取 URL 和 名称
+        href = tile["href"] or ""
+        raw_name = tile["name"] if tile["name"] is not None else "Unknown"
+
+        # URL 清洗（仅用于存储链接，不再用于生成ID）
+        if href:
+            full_url = urljoin(BASE_DOMAIN, href)
+            product_url = full_url.split('?')[0].lower().rstrip('/')
+        else:
+            product_url = ""
+
+        # 2. 提取价格
+        sale_text = tile["sale"]
+        orig_text = tile["orig"]
+
+        sale_price_val = parse_price(sale_text, self.price_locale) or 0.0
+        orig_price_val = parse_price(orig_text, self.price_locale) or 0.0
+
+        if sale_price_val > 0:
+            sale_price = sale_price_val
+            list_price = orig_price_val if orig_price_val > 0 else sale_price_val
+        else:
+            sale_price = orig_price_val
+            list_price = orig_price_val
+
+        discount = 0
+        if list_price > 0 and list_price > sale_price:
+            discount = round((list_price - sale_price) / list_price * 100)
+
+        # 3. 提取颜色
+        raw_color = tile["color"] if tile["color"] is not None else "Unknown"
+        if raw_color == "Unknown":
+            raw_color = tile["swatch"] if tile["swatch"] is not None else "Unknown"
+
+        # --- 4. 【核心】语义 ID 生成策略 ---
+        # 清洗名字和颜色
+        clean_name = raw_name.lower().strip()
+        clean_color = raw_color.lower().replace('/', '-').replace(' ', '').strip()
+
+        if clean_color == "unknown":
+            # 只有颜色未知时，才退回到使用 URL 哈希兜底
+            if product_url:
+                base_key = product_url
+            else:
+                base_key = clean_name # 极少情况
+            
+            base_sku = hashlib.md5(base_key.encode('utf-8')).hexdigest()[:10]
+            unique_sku_id = f"{base_sku}-unk"
+        else:
+            # 黄金标准：ID 由 "名字+颜色" 决定，彻底无视 URL 变化
+            composite_key = f"{clean_name}|{clean_color}"
+            unique_sku_id = hashlib.md5(composite_key.encode('utf-8')).hexdigest()[:12]
+            
+            # base_sku 用于聚合（同名商品），使用名字哈希
+            base_sku = hashlib.md5(clean_name.encode('utf-8')).hexdigest()[:10]
+
+        # 5. 去重
+        if unique_sku_id in seen_variants:
+            return None
+        seen_variants.add(unique_sku_id)
+
+        full_name = f"{raw_name} - {raw_color}".strip(" -") if raw_color != "Unknown" else raw_name
+        
+        # 6. 图片提取
+        # 优先找 lazy load 图片类，找不到则找任意 img（已在页面内选好）
+        image_url = ""
+        raw_src = tile["img"]
+        if raw_src:
+            # 智能拼接相对路径
+            image_url = urljoin(BASE_DOMAIN, raw_src.split('?')[0])
+
+        return {
+            "sku_id": unique_sku_id,
+            "product_id": base_sku,
+            "name": full_name,
+            "url": product_url,
+            "image_url": image_url,
+            "list_price": list_price,
+            "sale_price": sale_price,
+            "discount_percentage": discount,
+            "color": raw_color,
+            "size": None,
+            "source": "lacordee"
+        }
+
+    def fetch_batches(self):
+        """逐页产出 (页码, 商品列表)；浏览器操作全部在浏览器线程中执行。"""
+        yield from iter_in_browser_thread(self._fetch_with_browser)
+
+    def _fetch_with_browser(self):
+        """用浏览器逐页抓取，逐页产出 (页码, 商品列表)；浏览器页面在整个生成过程中保持打开。"""
+        total = 0
         seen_variants = set()
+        failed_pages = []  # 尚未确认在目录范围内的失败页：(页码, 尝试次数, 错误)
         
         # --- 配置 ---
         max_retries = 3
-        BASE_DOMAIN = "https://www.lacordee.com"
+        # 相邻两次页面访问至少间隔 delay 秒（按域名在进程内共享的礼貌性限速）
+        limiter = get_domain_limiter(self.search_url, 1 / self.delay if self.delay else 100)
 
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent=self.headers.get("User-Agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
-            )
-            page = context.new_page()
+        # 复用常驻浏览器，每次运行只新建一个隔离的 context
+        with get_browser_pool(self.cfg, self.log).page_for_site(
+            self.cfg,
+            viewport={'width': 1920, 'height': 1080},
+            user_agent=self.headers.get("User-Agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
+        ) as page:
 
             for page_num in range(1, self.max_pages + 1):
                 url = f"{self.search_url}&page={page_num}"
@@ -35,146 +156,65 @@ class LaCordeeScraper(CoreScraper):
 
                 # --- 重试循环 ---
                 for attempt in range(1, max_retries + 1):
+                    page_start = time.time()
+                    page_products = []
                     try:
-                        # 使用 domcontentloaded 加快失败判定（不等广告脚本）
-                        page.goto(url, wait_until="domcontentloaded", timeout=20000)
-                        time.sleep(3)
-
+                        # 最小访问间隔由限速器保证，不再固定 sleep
+                        limiter.acquire()
                         try:
-                            # 等待商品容器出现
-                            page.wait_for_selector('article.item-root-Fmc', timeout=20000)
-                        except:
+                            # 等待网格数据请求 / 商品元素出现并且数量稳定
+                            self.waits.navigate(page, url, TILE_SELECTOR)
+                        except Exception as e:
                             if attempt < max_retries:
-                                raise Exception("未找到商品元素 (加载超时)")
+                                raise Exception(f"未找到商品元素 (加载超时): {e}")
                             else:
                                 self.log(f"第 {page_num} 页多次重试后仍未发现商品，跳过。")
+                                failed_pages.append((page_num, attempt, e))
                                 break 
 
-                        # 滚动加载图片
+                        # 滚动触发懒加载，等待新卡片/图片稳定
                         page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                        time.sleep(2)
+                        self.waits.settle(page, TILE_SELECTOR)
                         page.evaluate("window.scrollTo(0, 0)")
 
-                        items = page.query_selector_all('article.item-root-Fmc')
-                        self.log(f"第 {page_num} 页找到 {len(items)} 个商品")
+                        # 一次 evaluate 取回所有商品卡片的原始字段（纯 JSON），避免逐元素 IPC 往返
+                        tiles = page.eval_on_selector_all(TILE_SELECTOR, EXTRACT_TILES_JS)
+                        self.log(f"第 {page_num} 页找到 {len(tiles)} 个商品")
 
-                        if not items:
+                        if not tiles:
                             break
 
                         # --- 解析逻辑 ---
-                        for item in items:
+                        for tile in tiles:
                             try:
-                                # 1. 提取 URL 和 名称
-                                link_elem = item.query_selector('a.item-name-YL8')
-                                href = link_elem.get_attribute('href') if link_elem else ""
-                                name_elem = item.query_selector('h3')
-                                raw_name = name_elem.inner_text().strip() if name_elem else "Unknown"
-
-                                # URL 清洗（仅用于存储链接，不再用于生成ID）
-                                if href:
-                                    full_url = urljoin(BASE_DOMAIN, href)
-                                    product_url = full_url.split('?')[0].lower().rstrip('/')
-                                else:
-                                    product_url = ""
-
-                                # 2. 提取价格
-                                sale_elem = item.query_selector('span.price-specialPrice-6Lo')
-                                orig_elem = item.query_selector('span.price-normalPrice-zvG')
-                                sale_text = sale_elem.inner_text().strip() if sale_elem else None
-                                orig_text = orig_elem.inner_text().strip() if orig_elem else None
-
-                                def parse_price(text):
-                                    if not text: return 0.0
-                                    return float(re.sub(r'[^\d.]', '', text))
-
-                                sale_price_val = parse_price(sale_text)
-                                orig_price_val = parse_price(orig_text)
-
-                                if sale_price_val > 0:
-                                    sale_price = sale_price_val
-                                    list_price = orig_price_val if orig_price_val > 0 else sale_price_val
-                                else:
-                                    sale_price = orig_price_val
-                                    list_price = orig_price_val
-
-                                discount = 0
-                                if list_price > 0 and list_price > sale_price:
-                                    discount = round((list_price - sale_price) / list_price * 100)
-
-                                # 3. 提取颜色
-                                color_elem = item.query_selector('dd')
-                                raw_color = color_elem.inner_text().strip() if color_elem else "Unknown"
-                                if raw_color == "Unknown":
-                                    swatch_elem = item.query_selector('button.swatch-button-cZb[title]')
-                                    raw_color = swatch_elem.get_attribute('title') if swatch_elem else "Unknown"
-
-                                # --- 4. 【核心】语义 ID 生成策略 ---
-                                # 清洗名字和颜色
-                                clean_name = raw_name.lower().strip()
-                                clean_color = raw_color.lower().replace('/', '-').replace(' ', '').strip()
-
-                                if clean_color == "unknown":
-                                    # 只有颜色未知时，才退回到使用 URL 哈希兜底
-                                    if product_url:
-                                        base_key = product_url
-                                    else:
-                                        base_key = clean_name # 极少情况
-                                    
-                                    base_sku = hashlib.md5(base_key.encode('utf-8')).hexdigest()[:10]
-                                    unique_sku_id = f"{base_sku}-unk"
-                                else:
-                                    # 黄金标准：ID 由 "名字+颜色" 决定，彻底无视 URL 变化
-                                    composite_key = f"{clean_name}|{clean_color}"
-                                    unique_sku_id = hashlib.md5(composite_key.encode('utf-8')).hexdigest()[:12]
-                                    
-                                    # base_sku 用于聚合（同名商品），使用名字哈希
-                                    base_sku = hashlib.md5(clean_name.encode('utf-8')).hexdigest()[:10]
-
-                                # 5. 去重
-                                if unique_sku_id in seen_variants:
-                                    continue
-                                seen_variants.add(unique_sku_id)
-
-                                full_name = f"{raw_name} - {raw_color}".strip(" -") if raw_color != "Unknown" else raw_name
-                                
-                                # 6. 图片提取
-                                # 优先找 lazy load 图片类，找不到则找任意 img
-                                img_elem = item.query_selector('img[class*="item-imageLoaded"]') or item.query_selector('img')
-                                image_url = ""
-                                if img_elem:
-                                    raw_src = img_elem.get_attribute('src') or img_elem.get_attribute('data-src')
-                                    if raw_src:
-                                        # 智能拼接相对路径
-                                        image_url = urljoin(BASE_DOMAIN, raw_src.split('?')[0])
-
-                                products.append({
-                                    "sku_id": unique_sku_id,
-                                    "product_id": base_sku,
-                                    "name": full_name,
-                                    "url": product_url,
-                                    "image_url": image_url,
-                                    "list_price": list_price,
-                                    "sale_price": sale_price,
-                                    "discount_percentage": discount,
-                                    "color": raw_color,
-                                    "size": None,
-                                    "source": "lacordee"
-                                })
-
-                            except Exception as e:
+                                product = self._build_product(tile, seen_variants)
+                            except Exception:
                                 continue
+                            if product:
+                                page_products.append(product)
 
-                        time.sleep(time.time() % 2 + 1)
+                        self.log(f"第 {page_num} 页耗时 {time.time() - page_start:.1f}s")
                         break # 成功，跳出重试循环
 
                     except Exception as e:
-                        self.log(f"⚠️ 第 {page_num} 页 (第 {attempt} 次尝试) 失败: {e}")
-                        if attempt < max_retries:
-                            time.sleep(5)
-                        else:
+                        self.log(f"⚠️ 第 {page_num} 页 (第 {attempt} 次尝试) 失败: {e}（耗时 {time.time() - page_start:.1f}s）")
+                        if attempt >= max_retries:
                             self.log(f"❌ 第 {page_num} 页已达到最大重试次数，跳过。")
-
-            browser.close()
-
-        self.log(f"抓取完成，共入库 {len(products)} 条商品")
-        return products
+                            failed_pages.append((page_num, attempt, e))
+
+                if page_products:
+                    # 后面的页还有商品，之前失败的页在目录范围内：记为失败页，这些页上的已知商品本次不累计未出现次数
+                    for failed in failed_pages:
+                        self.checkpoint_page_failed(*failed)
+                    failed_pages = []
+                    total += len(page_products)
+                    yield page_num, page_products
+
+        if failed_pages:
+            # 最后一个有商品的页之后的失败页（加载超时多半是因为已超出目录末尾）不记为失败页
+            self.log(f"第 {', '.join(str(f[0]) for f in failed_pages)} 页在最后一个有商品的页之后，不记为失败页。")
+        self.log(f"抓取完成，共入库 {total} 条商品")
+
+    def close(self):
+        close_browser_pool()
+        super().close()
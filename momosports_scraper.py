@@ -1,128 +1,138 @@
 # 文件名: momosports_scraper.py
 
-import json
-from urllib.parse import urljoin
-from bs4 import BeautifulSoup
-from core_scraper import CoreScraper, requests
-import time
-import re
+from core_scraper import CoreScraper
+from extraction import ParsedPage
+from parse_pool import completed
 
 class MomoSportsScraper(CoreScraper):
     """
     Momo Sports 专属爬虫，实现了先抓HTML首页，再抓API后续页的混合逻辑。
     """
 
-    def _get_total_count(self, soup):
-        """从HTML或HTML片段中提取商品总数。"""
-        try:
-            toolbar_amount = soup.select_one("p.toolbar-amount")
-            if toolbar_amount:
-                # 正则表达式匹配 "of 157" 这样的模式
-                match = re.search(r'of\s+(\d+)', toolbar_amount.text)
-                if match:
-                    return int(match.group(1))
-        except Exception:
-            return 0
-        return 0
+    def _bootstrap(self, page_size):
+        """抓取第 1 页的完整HTML，同时拿到会话Cookie并写入Cookie罐。返回页面HTML。"""
+        main_page_url = f"{self.api_url}?product_list_limit={page_size}"
+        self.log(f"📦 正在抓取第 1 页 (通过解析HTML)...")
+        response = self._make_request("GET", main_page_url, timeout=30)
+        response.raise_for_status()
+        self.persist_cookies(self.api_url)
+        return response.text
+
+    def _request_api_page(self, page, page_size):
+        params = {
+            'p': page,
+            'product_list_limit': page_size,
+            'shopbyAjax': 1
+        }
+        return self._make_request("GET", self.api_url, params=params)
+
+    def _parse_page(self, html_text):
+        """解析一次页面（完整HTML或 categoryProducts 片段），商品和商品总数都从这一次解析中读取。"""
+        return ParsedPage(html_text, self.extraction, self.base_url, log=self.log)
+
+    def _fetch_api_fragment(self, page, page_size):
+        """请求API的一页，返回商品HTML片段（可能为空）；服务端以 401/403 拒绝时返回 None。"""
+        response = self._request_api_page(page, page_size)
+        if response.status_code in (401, 403):
+            self.log(f"⚠️ API返回 {response.status_code}。")
+            return None
+        response.raise_for_status()
+        return response.json().get('categoryProducts') or ''
+
+    def _fetch_api_page(self, page, page_size):
+        """
+        请求API的一页，返回解析后的 ParsedPage（没有商品HTML时 doc 为 None）；服务端以 401/403 拒绝时返回 None。
+        每页条数试探时已抓过的第 1 页直接复用，不再重复请求和解析。
+        """
+        probed = self.probed_page(page, page_size)
+        if probed is not None:
+            return probed
+        fragment = self._fetch_api_fragment(page, page_size)
+        return None if fragment is None else self._parse_page(fragment)
 
-    def fetch_data(self):
-        """实现两步走策略：先抓HTML，再抓API。"""
-        all_products = []
+    def _probe_api_page(self, size):
+        """以指定每页条数请求API第 1 页，返回 (ParsedPage, 返回条数, 商品总数)，供每页条数试探使用。"""
+        parsed = self._fetch_api_page(1, size)
+        if parsed is None:
+            raise RuntimeError("API拒绝访问 (401/403)")
+        return parsed, len(parsed.products), parsed.total_count
+
+    def _fetch_api_products(self, page, page_size):
+        """
+        抓取后续的一页，返回结果为商品列表的 Future：解析交给解析进程池（如已启用），下载线程立刻去抓下一页。
+        被拒绝时重新抓取HTML页面刷新一次Cookie后重试，仍被拒绝则抛出异常。
+        """
+        probed = self.probed_page(page, page_size)
+        if probed is not None:
+            return completed(probed.products)
+        default_size = self.cfg.get("pagination", {}).get("page_size", 36)
+        fragment = self.fetch_with_cookie_refresh(
+            page, lambda: self._fetch_api_fragment(page, page_size),
+            self.api_url, lambda: self._bootstrap(default_size)
+        )
+        if not fragment:
+            self.log(f"ℹ️ 第 {page} 页API未返回商品HTML内容。")
+        return self.submit_parse(fragment)
+
+    def fetch_batches(self):
+        """
+        实现两步走策略：先抓第 1 页，再抓API后续页，逐页产出 (页码, 商品列表)。
+        Cookie罐中有未过期的Cookie时第 1 页也走API，否则抓取完整HTML页面来获取Cookie；
+        API返回 401/403 时重新抓取HTML页面一次。
+        第 1 页只解析一次，商品和商品总数都取自这次解析；据此算出总页数后，剩余页面一次全部排入抓取队列，
+        按 concurrency 并发抓取、按页码顺序产出。
+        第 1 页的每页条数与后续页不同（HTML页面按配置值，后续按试探值）时，第 1 页记为第 0 页。
+        后续页失败时按退避重试，最终失败的页记录为检查点，下次运行从该页续抓。
+        """
         pagination = self.cfg.get("pagination", {})
-        page_size = pagination.get("page_size", 36)
-        
-        session = requests.Session()
-        session.headers.update(self.headers)
-        
-        # --- 第1步: 抓取并解析第一页 (HTML) ---
+        default_size = pagination.get("page_size", 36)
+        first_size = default_size  # 第 1 页实际使用的每页条数
+
+        # --- 第1步: 抓取并解析第一页 ---
         try:
-            main_page_url = f"{self.api_url}?product_list_limit={page_size}"
-            self.log(f"📦 正在抓取第 1 页 (通过解析HTML)...")
-            response = session.get(main_page_url, impersonate=self.impersonate, timeout=30)
-            response.raise_for_status()
-            
-            # Session会自动保存Cookie，同时我们直接解析这个页面的HTML
-            page1_products = self.parse_data(response.text, self.base_url)
-            all_products.extend(page1_products)
+            first_page = None
+            if self.restore_cookies(self.api_url):
+                first_size = self.tuned_page_size(default_size, self._probe_api_page)
+                self.log(f"📦 正在抓取第 1 页 (通过API)...")
+                first_page = self._fetch_api_page(1, first_size)
+                if first_page is None:
+                    self.log("⚠️ 已保存的Cookie失效。")
+                    self.invalidate_cookies(self.api_url)
+            if first_page is None or first_page.doc is None:
+                first_size = default_size
+                self._crawl["bootstrapped"] = True
+                first_page = self._parse_page(self._bootstrap(first_size))
+            # 有了Cookie之后才能试探；已缓存或刚试探过时不会再发请求，试探抓到的页由 _fetch_api_products 复用
+            page_size = self.tuned_page_size(default_size, self._probe_api_page)
+
+            page1_products = first_page.products
             self.log(f"✅ 第 1 页解析成功，找到 {len(page1_products)} 个商品。")
-            
-            # 从第一页获取商品总数，以决定总共需要翻多少页
-            soup = BeautifulSoup(response.text, 'lxml')
-            total_count = self._get_total_count(soup)
+
+            # 商品总数与商品取自同一次解析，以决定总共需要翻多少页
+            total_count = first_page.total_count
             if total_count > 0:
                 total_pages = (total_count + page_size - 1) // page_size
-                self.log(f"ℹ️ 商品总数: {total_count}，共计 {total_pages} 页。")
+                self.log(f"ℹ️ 商品总数: {total_count}，每页 {page_size} 个，共计 {total_pages} 页。")
             else:
-                total_pages = pagination.get("max_pages", 10)
+                total_pages = -(-pagination.get("max_pages", 10) * default_size // page_size)
                 self.log(f"⚠️ 未能获取商品总数，将按最大页数 {total_pages} 抓取。")
 
         except Exception as e:
-            self.log(f"❌ 抓取第 1 页 (HTML) 失败: {e}")
-            return [] # 如果第一页都失败了，就没必要继续了
-
-        # --- 第2步: 循环抓取后续页 (API) ---
-        for page in range(2, total_pages + 1):
-            self.log(f"📦 正在抓取第 {page}/{total_pages} 页 (通过API)...")
-            params = {
-                'p': page,
-                'product_list_limit': page_size,
-                'shopbyAjax': 1
-            }
-            try:
-                response = session.get(self.api_url, params=params, impersonate=self.impersonate, timeout=20)
-                response.raise_for_status()
-                json_data = response.json()
-                html_content = json_data.get('categoryProducts')
-
-                if not html_content:
-                    self.log("ℹ️ API未返回商品HTML内容，停止翻页。")
-                    break
-
-                page_products = self.parse_data(html_content, self.base_url)
-                if not page_products: break
-                
-                all_products.extend(page_products)
-                time.sleep(self.cfg.get("delay", 1))
-            except Exception as e:
-                self.log(f"❌ 抓取第 {page} 页 (API) 失败: {e}")
-                break
-        return all_products
+            self.log(f"❌ 抓取第 1 页失败: {e}")
+            return # 如果第一页都失败了，就没必要继续了
+        finally:
+            first_page = None  # 释放第 1 页的文档树
+        yield (1 if first_size == page_size else 0), page1_products
 
-    def parse_data(self, html_text, base_url):
-        """解析HTML片段，此方法被两步策略共用。"""
-        self.log("🤖 正在使用 BeautifulSoup 解析HTML内容...")
-        try:
-            soup = BeautifulSoup(html_text, 'lxml')
-            products = []
-            product_items = soup.select('li.product-item')
-            for item in product_items:
-                try:
-                    name_tag = item.select_one('a.product-item-link')
-                    link_tag = item.select_one('a.product-item-photo')
-                    image_tag = item.select_one('img.product-image-photo')
-                    sku_id_raw = item.get('id', '')
-                    final_price_tag = item.select_one('.price-final_price .price')
-                    old_price_tag = item.select_one('.old-price .price')
-
-                    if not (name_tag and link_tag and sku_id_raw and final_price_tag): continue
-                    
-                    name = name_tag.text.strip()
-                    product_url = link_tag.get('href')
-                    image_url = image_tag.get('src') if image_tag else None
-                    sku_id = sku_id_raw.replace('product-sku-', '')
-                    sale_price = float(re.sub(r'[^\d.]', '', final_price_tag.text))
-                    list_price = float(re.sub(r'[^\d.]', '', old_price_tag.text)) if old_price_tag else sale_price
-                    discount = round((1 - sale_price / list_price) * 100) if list_price > sale_price else 0
-
-                    products.append({
-                        "sku_id": sku_id, "product_id": sku_id, "name": name, "url": product_url, 
-                        "image_url": image_url, "list_price": list_price, "sale_price": sale_price, 
-                        "discount_percentage": discount, "color": None, "size": None
-                    })
-                except Exception as e:
-                    self.log(f"⚠️ 解析单个商品时出错: {e}")
-            self.log(f"✅ 解析完成，找到 {len(products)} 个商品。")
-            return products
-        except Exception as e:
-            self.log(f"❌ 在MomoSportsScraper中解析HTML时发生严重错误: {e}")
-            return []
\ No newline at end of file
+        # --- 第2步: 一次排好全部后续页 (API) ---
+        # 第 1 页已覆盖前 first_size 个商品，从第一个未覆盖完的页继续；上次中断时从中断的页续抓
+        self.page_size = page_size
+        start_page = max(first_size // page_size + 1, self.resume_page(page_size))
+        if start_page > total_pages:
+            return
+        yield from self._fetch_pages_concurrently(
+            total_pages, self.cfg.get("concurrency", 1), start_page,
+            fetch_page=lambda page: self._fetch_api_products(page, page_size),
+            # 总数已知时全部剩余页一次排队；未知时按滑动窗口发现，遇到空页停止
+            window=total_pages - start_page + 1 if total_count > 0 else None
+        )
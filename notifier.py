@@ -0,0 +1,69 @@
+# 文件名: notifier.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class BarkDispatcher:
+    """
+    Bark 通知分发器：用有界线程池并发推送，调用方提交后立即返回，
+    不再为每个商品 × 每台设备串行等待网络往返。
+    """
+
+    def __init__(self, send_func, max_workers=8, log=print):
+        self.send_func = send_func
+        self.max_workers = max_workers
+        self.log = log
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bark")
+        self._futures = set()
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+
+    def submit(self, bark_url, payload):
+        """提交一条推送任务（非阻塞）。future 的结果为 None（成功）或错误信息。"""
+        future = self._executor.submit(self._send, bark_url, payload)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def free_slots(self):
+        """线程池中还能立即开始发送的推送数（工作线程数减去在途和排队中的推送）。"""
+        with self._lock:
+            return max(0, self.max_workers - len(self._futures))
+
+    def _send(self, bark_url, payload):
+        try:
+            response = self.send_func(bark_url, payload)
+            response.raise_for_status()
+            with self._lock:
+                self.sent += 1
+            return None
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            self.log(f"    -> Bark 推送失败 ({payload.get('title')}): {e}")
+            return str(e)
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def flush(self, timeout=30):
+        """等待所有在途推送完成；超过截止时间则取消仍在排队的推送。返回未完成的数量。"""
+        with self._lock:
+            futures = list(self._futures)
+        if not futures:
+            return 0
+        _, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            cancelled = sum(1 for future in not_done if future.cancel())
+            self.log(f"    -> {len(not_done)} 条推送在 {timeout}s 内未完成，已取消 {cancelled} 条排队中的推送。")
+        return len(not_done)
+
+    def close(self, timeout=30):
+        """刷新后关闭线程池，取消尚未开始的推送。"""
+        remaining = self.flush(timeout)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        return remaining
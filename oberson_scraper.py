@@ -1,10 +1,12 @@
 # oberson_scraper.py
 import json
 import re
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup
+from browser_pool import close_browser_pool, get_browser_pool, iter_in_browser_thread
 from core_scraper import CoreScraper
-from playwright.sync_api import sync_playwright
+from product_batch import ProductBatch
 
 def extract_json_from_html_attribute(raw):
     if not raw:
@@ -29,18 +31,117 @@ def safe_parse_data_product(raw):
     except:
         return None
 
-class ObersonScraper(CoreScraper):
-    def fetch_data(self):
-        all_products = []
-        pages = self.cfg.get('pages_to_scrape', [1, 2])
+def feed_product_to_data(product):
+    """把 Shopify products.json 中的一个商品转换成与 data-product 属性相同的结构。"""
+    variants = product.get('variants') or []
+    prices = [float(v['price']) for v in variants if v.get('price')]
+    compare = [float(v['compare_at_price']) for v in variants if v.get('compare_at_price')]
+    tags = product.get('tags') or []
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(',')]
+    return {
+        'id': product.get('id'),
+        'handle': product.get('handle', ''),
+        'title': product.get('title', ''),
+        'tags': tags + [product.get('vendor') or ''],
+        'priceMin': min(prices) if prices else 0,
+        'compareAtPriceMin': min(compare) if compare else None,
+        'images': product.get('images') or [{}],
+        'variants': [{'id': v.get('id'), 'title': v.get('title', '')} for v in variants],
+    }
 
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent=self.headers.get("User-Agent", "")
+class ObersonScraper(CoreScraper):
+    def _build_products(self, data, name, products):
+        """把一个 data-product 结构展开成每个变体一条商品，追加到 products（ProductBatch）；非 Arc'teryx 商品跳过。"""
+        tags = [str(t).lower() for t in data.get('tags', [])]
+        if 'arc' not in ' '.join(tags):
+            return
+
+        handle = data.get('handle', '')
+        product_url = urljoin(self.base_url, f"/en/products/{handle}")
+        product_id = str(data.get('id', ''))
+
+        list_price = float(data.get('compareAtPriceMin') or data.get('priceMin', 0))
+        sale_price = float(data.get('priceMin', 0))
+        discount = round((1 - sale_price / list_price) * 100) if list_price > sale_price else 0
+
+        image_url = (data.get('images') or [{}])[0].get('src', '')
+        if image_url and image_url.startswith('//'):
+            image_url = 'https:' + image_url
+
+        for v in data.get('variants', []):
+            title = v.get('title', '')
+            parts = [p.strip() for p in title.split('/') if p.strip()]
+            color = parts[0] if len(parts) > 0 else None
+            size = parts[1] if len(parts) > 1 else None
+
+            products.append(
+                str(v.get('id', '')), product_id, f"{name} - {title}", product_url, image_url,
+                list_price, sale_price, discount, color, size
             )
-            page = context.new_page()
+
+    def _parse_collection_html(self, html):
+        """解析集合页 HTML 中的 Boost 商品卡片，返回 (卡片数, ProductBatch)。"""
+        soup = BeautifulSoup(html, 'lxml')
+        items = soup.select('div.boost-sd__product-item')
+        products = ProductBatch()
+        for item in items:
+            data = safe_parse_data_product(item.get('data-product', ''))
+            if not data:
+                continue
+            title_tag = item.select_one('.boost-sd__product-title')
+            name = title_tag.get_text(strip=True) if title_tag else "Unknown"
+            self._build_products(data, name, products)
+        return len(items), products
+
+    def _fetch_page_fast(self, page_num, mode):
+        """不经浏览器直接抓取一页：html 模式解析集合页卡片，feed 模式读取 products.json。"""
+        if mode == 'feed':
+            url = f"{self.cfg['main_page_url']}/products.json?page={page_num}&limit=250"
+            response = self._make_request("GET", url)
+            response.raise_for_status()
+            products = ProductBatch()
+            for product in response.json().get('products', []):
+                data = feed_product_to_data(product)
+                self._build_products(data, data['title'], products)
+            return products
+
+        url = f"{self.cfg['main_page_url']}?page={page_num}"
+        response = self._make_request("GET", url)
+        response.raise_for_status()
+        item_count, products = self._parse_collection_html(response.text)
+        self.log(f"Page {page_num} (HTTP): {item_count} product cards")
+        return products
+
+    def _fetch_fast_path(self, pages, mode):
+        """
+        并发抓取页面（最多 concurrency 个同时在途），按页码顺序逐页产出 (页码, ProductBatch)，只产出有商品的页。
+        某页一完成且之前的页都已产出就立即产出，不等全部页面抓完；单页失败只记录日志。
+        """
+        concurrency = max(1, min(self.cfg.get("concurrency", 1), len(pages)))
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [(n, executor.submit(self._fetch_page_fast, n, mode)) for n in pages]
+            try:
+                for page_num, future in futures:
+                    try:
+                        products = future.result()
+                    except Exception as e:
+                        self.log(f"Page {page_num} (HTTP) error: {e}")
+                        continue
+                    if products:
+                        yield page_num, products
+            finally:
+                # 调用方提前停止时，取消尚未开始的页面
+                for _, future in futures:
+                    future.cancel()
+
+    def _fetch_with_browser(self, pages):
+        """用浏览器逐页抓取，逐页产出 (页码, 商品列表)；在浏览器线程中运行（见 fetch_batches）。"""
+        with get_browser_pool(self.cfg, self.log).page_for_site(
+            self.cfg,
+            viewport={'width': 1920, 'height': 1080},
+            user_agent=self.headers.get("User-Agent", "")
+        ) as page:
 
             for page_num in pages:
                 url = f"{self.cfg['main_page_url']}?page={page_num}"
@@ -50,57 +151,31 @@ class ObersonScraper(CoreScraper):
                     page.goto(url, wait_until="domcontentloaded", timeout=60000)
                     page.wait_for_selector('div.boost-sd__product-item', timeout=30000)
 
-                    soup = BeautifulSoup(page.content(), 'lxml')
-                    items = soup.select('div.boost-sd__product-item')
-                    self.log(f"Page {page_num}: {len(items)} Arc'teryx products")
-
-                    for item in items:
-                        data = safe_parse_data_product(item.get('data-product', ''))
-                        if not data:
-                            continue
-
-                        tags = [str(t).lower() for t in data.get('tags', [])]
-                        if 'arc' not in ' '.join(tags):
-                            continue
-
-                        title_tag = item.select_one('.boost-sd__product-title')
-                        name = title_tag.get_text(strip=True) if title_tag else "Unknown"
-
-                        handle = data.get('handle', '')
-                        product_url = urljoin(self.base_url, f"/en/products/{handle}")
-                        product_id = str(data.get('id', ''))
-
-                        list_price = float(data.get('compareAtPriceMin') or data.get('priceMin', 0))
-                        sale_price = float(data.get('priceMin', 0))
-                        discount = round((1 - sale_price / list_price) * 100) if list_price > sale_price else 0
-
-                        image_url = data.get('images', [{}])[0].get('src', '')
-                        if image_url and image_url.startswith('//'):
-                            image_url = 'https:' + image_url
-
-                        for v in data.get('variants', []):
-                            title = v.get('title', '')
-                            parts = [p.strip() for p in title.split('/') if p.strip()]
-                            color = parts[0] if len(parts) > 0 else None
-                            size = parts[1] if len(parts) > 1 else None
-
-                            all_products.append({
-                                "sku_id": str(v.get('id', '')),
-                                "product_id": product_id,
-                                "name": f"{name} - {title}",
-                                "url": product_url,
-                                "image_url": image_url,
-                                "list_price": list_price,
-                                "sale_price": sale_price,
-                                "discount_percentage": discount,
-                                "color": color,
-                                "size": size
-                            })
-
+                    item_count, products = self._parse_collection_html(page.content())
+                    self.log(f"Page {page_num}: {item_count} Arc'teryx products")
                 except Exception as e:
                     self.log(f"Page {page_num} error: {e}")
+                    continue
+                if products:
+                    yield page_num, products
 
-            browser.close()
-
-        self.log(f"Total fetched: {len(all_products)} Arc'teryx products")
-        return all_products
\ No newline at end of file
+    def fetch_batches(self):
+        pages = self.cfg.get('pages_to_scrape', [1, 2])
+        mode = self.cfg.get('fast_path', 'html')
+
+        total = 0
+        if mode:
+            for page_num, products in self._fetch_fast_path(pages, mode):
+                total += len(products)
+                yield page_num, products
+            if not total:
+                self.log(f"HTTP 快速通道 ({mode}) 未取到商品，改用浏览器抓取。")
+        if not total:
+            for page_num, products in iter_in_browser_thread(self._fetch_with_browser, pages):
+                total += len(products)
+                yield page_num, products
+        self.log(f"Total fetched: {total} Arc'teryx products")
+
+    def close(self):
+        close_browser_pool()
+        super().close()
@@ -0,0 +1,122 @@
+# 文件名: orchestrator.py
+
+import glob
+import heapq
+import json
+import os
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from parse_pool import shutdown_parse_pool
+
+
+class Orchestrator:
+    """
+    常驻多站点调度器：启动时一次性加载目录下所有启用的配置（enabled，默认 true）并创建爬虫实例，
+    之后按各站点自己的间隔（带随机抖动）重复执行，全局并发数受 max_concurrency 限制。
+    爬虫实例在多次运行之间保持存活，数据库连接、HTTP 会话和浏览器都可以复用。
+    """
+
+    def __init__(self, config_dir, scraper_factory, max_concurrency=2,
+                 default_interval=600, default_jitter=0.1):
+        self.max_concurrency = max_concurrency
+        self.default_interval = default_interval
+        self.default_jitter = default_jitter
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running = set()
+        self.scrapers = {}
+
+        for config_path in sorted(glob.glob(os.path.join(config_dir, "*.json"))):
+            try:
+                # 先读取 enabled，禁用的站点不创建爬虫实例（不会打开它的数据库和日志路径）
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    cfg = json.load(f)
+                if not cfg.get("enabled", True):
+                    self.log(f"{cfg.get('site_name', config_path)} 已在配置中禁用，跳过。")
+                    continue
+                scraper = scraper_factory(config_path)
+            except Exception as e:
+                self.log(f"加载配置 {config_path} 失败，已跳过: {e}")
+                continue
+            if "schedule_interval" not in scraper.cfg:
+                self.log(f"{scraper.site_name} 未配置 schedule_interval，使用默认间隔 {self.default_interval}s。")
+            self.scrapers[scraper.site_name] = scraper
+        self.log(f"已加载 {len(self.scrapers)} 个站点: {', '.join(self.scrapers)}")
+
+    def log(self, message):
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        print(f"[{timestamp}] [调度器] {message}", flush=True)
+
+    def _next_delay(self, scraper):
+        """下一次运行前的等待秒数：配置的间隔 ± 抖动。"""
+        interval = scraper.cfg.get("schedule_interval", self.default_interval)
+        jitter = scraper.cfg.get("schedule_jitter", self.default_jitter)
+        return interval * (1 + random.uniform(-jitter, jitter))
+
+    def _run_site(self, site_name):
+        scraper = self.scrapers[site_name]
+        start = time.time()
+        try:
+            scraper.run()
+        except Exception as e:
+            scraper.log(f"运行出错: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(site_name)
+            self.log(f"{site_name} 本轮完成，用时 {time.time() - start:.1f}s")
+
+    def stop(self, *args):
+        self.log("收到停止信号，等待正在运行的站点结束...")
+        self._stop.set()
+
+    def run_forever(self):
+        """主调度循环，直到收到 SIGTERM/SIGINT。"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # 首轮启动时间在 30 秒内错开，避免所有站点同时起跑
+        now = time.time()
+        schedule = [(now + random.uniform(0, 30), name) for name in self.scrapers]
+        heapq.heapify(schedule)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="site")
+        try:
+            while schedule and not self._stop.is_set():
+                due, site_name = schedule[0]
+                wait = due - time.time()
+                if wait > 0:
+                    self._stop.wait(min(wait, 5))
+                    continue
+
+                with self._lock:
+                    if len(self._running) >= self.max_concurrency:
+                        budget_full = True
+                    else:
+                        budget_full = False
+                        already_running = site_name in self._running
+                        if not already_running:
+                            self._running.add(site_name)
+                if budget_full:
+                    # 并发预算已用完：保留队首（最早到期的站点），等有空位再启动
+                    self._stop.wait(1)
+                    continue
+
+                heapq.heappop(schedule)
+                if already_running:
+                    # 同一站点上一轮还没结束 → 稍后再试
+                    heapq.heappush(schedule, (time.time() + 5, site_name))
+                    continue
+
+                executor.submit(self._run_site, site_name)
+                heapq.heappush(schedule, (time.time() + self._next_delay(self.scrapers[site_name]), site_name))
+        finally:
+            executor.shutdown(wait=True)
+            for scraper in self.scrapers.values():
+                scraper.close()
+            shutdown_parse_pool()
+            self.log("调度器已退出。")
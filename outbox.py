@@ -0,0 +1,242 @@
+# 文件名: outbox.py
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+
+
+class CircuitBreaker:
+    """
+    单个推送端点的熔断器。
+    连续失败达到阈值后熔断；冷却期过后只放行一次试探请求（半开），成功则恢复。
+    """
+
+    def __init__(self, threshold=5, cooldown=300):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if time.time() - self.opened_at >= self.cooldown:
+            # 半开：重新计时，保证冷却期内只放行这一次试探
+            self.opened_at = time.time()
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.time()
+
+
+class OutboxSender:
+    """
+    从站点数据库的 outbox 表中领取待发送通知并投递。
+    失败的通知按指数退避重试，超过最大次数标记为 dead；每个端点独立熔断。
+    领取时加租约（status = sending），多个发送方同时运行也不会重复发送同一条通知。
+    """
+
+    def __init__(self, scraper):
+        self.scraper = scraper
+        self.table = scraper.outbox_table
+        cfg = scraper.cfg.get("outbox", {})
+        self.max_attempts = cfg.get("max_attempts", 8)
+        self.backoff_base = cfg.get("backoff_base", 30)
+        self.backoff_max = cfg.get("backoff_max", 3600)
+        self.batch_size = cfg.get("batch_size", 50)
+        self.poll_interval = cfg.get("poll_interval", 15)
+        self.retention_days = cfg.get("retention_days", 7)
+        self.breaker_threshold = cfg.get("breaker_threshold", 5)
+        self.breaker_cooldown = cfg.get("breaker_cooldown", 300)
+        # 领取后的租约时长：应长于排队加发送的最长耗时，到期未写回结果的通知会被重新领取
+        self.lease_seconds = cfg.get("lease_seconds", 120)
+        self.breakers = {}
+        # 本进程已提交、结果尚未写回的通知：row id -> Future。租约到期后也不会被本进程再次领取
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def _breaker(self, endpoint):
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+            self.breakers[endpoint] = breaker
+        return breaker
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _claim(self, last_id, limit=None):
+        """
+        在一个写事务里领取一批到期的通知：状态改为 sending，next_attempt_at 改为租约到期时间。
+        租约未到期的行不会被其它发送方（run() 内的内联投递、--send-outbox 进程）再次领取；
+        发送方中途退出时，租约到期后由下一个发送方重新领取。本进程仍在发送的行即使租约到期也不再领取。
+        limit 为最多领取的条数（推送线程池的空闲数），领满即停止扫描，租约从接近真正发送时开始计算。
+        返回 (本次扫描到的行, 领取到的行)。
+        """
+        now = time.time()
+        with self._inflight_lock:
+            busy = set(self._inflight)
+        with self.scraper.transaction() as conn:
+            rows = conn.execute(f"""
+                SELECT id, endpoint, payload, attempts FROM {self.table}
+                WHERE status IN ('pending', 'sending') AND next_attempt_at <= ? AND id > ?
+                ORDER BY id LIMIT ?
+            """, (now, last_id, self.batch_size)).fetchall()
+            scanned = []
+            claimed = []
+            for row in rows:
+                if limit is not None and len(claimed) >= limit:
+                    break
+                scanned.append(row)
+                # 熔断中的端点不领取，留待下次
+                if row['id'] not in busy and self._breaker(row['endpoint']).allow():
+                    claimed.append(row)
+            conn.executemany(
+                f"UPDATE {self.table} SET status = 'sending', next_attempt_at = ? WHERE id = ?",
+                [(now + self.lease_seconds, row['id']) for row in claimed]
+            )
+        return scanned, claimed
+
+    def _submit(self, row):
+        """把一条已领取的通知交给推送线程池，并登记为本进程在途，直到结果写回（见 _forget）。"""
+        future = self.scraper.notifier.submit(row['endpoint'], json.loads(row['payload']))
+        with self._inflight_lock:
+            self._inflight[row['id']] = future
+        return future
+
+    def _forget(self, row_id):
+        with self._inflight_lock:
+            self._inflight.pop(row_id, None)
+
+    def _record(self, conn, row, error):
+        """写回一条已领取通知的投递结果（由调用方负责事务）。成功返回 True。"""
+        self._forget(row['id'])
+        breaker = self._breaker(row['endpoint'])
+        if error is None:
+            breaker.record_success()
+            conn.execute(
+                f"UPDATE {self.table} SET status = 'sent', sent_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), row['id'])
+            )
+            return True
+        breaker.record_failure()
+        attempts = row['attempts'] + 1
+        status = 'dead' if attempts >= self.max_attempts else 'pending'
+        conn.execute(
+            f"UPDATE {self.table} SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+            (status, attempts, time.time() + self._backoff(attempts), str(error)[:500], row['id'])
+        )
+        return False
+
+    def _record_late(self, row, future):
+        """
+        推送完成后再写回结果（超过截止时间才完成的推送、dispatch 提交的推送），避免租约到期后重复发送。
+        排队时被取消的推送放回 pending（不计尝试次数），下一个发送方立即可以领取。
+        """
+        try:
+            with self.scraper.transaction() as conn:
+                if future.cancelled():
+                    self._forget(row['id'])
+                    conn.execute(
+                        f"UPDATE {self.table} SET status = 'pending', next_attempt_at = 0 WHERE id = ? AND status = 'sending'",
+                        (row['id'],)
+                    )
+                else:
+                    self._record(conn, row, future.result())
+        except Exception as e:
+            self.scraper.log(f"Outbox 写回投递结果出错: {e}")
+
+    def dispatch(self):
+        """
+        非阻塞投递：按推送线程池的空闲数领取已到期的通知，交给线程池后立即返回，结果在推送完成时由回调写回。
+        供抓取过程中的入库线程调用，入库速度不受推送延迟影响。线程池忙时不多领取：
+        否则排队的通知会在租约到期后被下一批再次领取、重复推送；没领到的由后续批次或运行结束时的 drain 投递。
+        返回提交的条数。
+        """
+        submitted = 0
+        last_id = 0
+        while True:
+            slots = self.scraper.notifier.free_slots()
+            if slots <= 0:
+                return submitted
+            rows, claimed = self._claim(last_id, limit=slots)
+            if not rows:
+                return submitted
+            last_id = rows[-1]['id']
+            for row in claimed:
+                future = self._submit(row)
+                future.add_done_callback(lambda f, row=row: self._record_late(row, f))
+                submitted += 1
+
+    def drain(self, timeout=None):
+        """
+        投递所有已到期的待发送通知，超过 timeout 秒则停止。返回 (成功数, 失败数)。
+        截止时还在排队的推送被取消并放回 pending（不计尝试次数）；正在发送的保留租约，完成后再写回结果。
+        超时不算端点失败，不会触发熔断。每批最多领取推送线程池的空闲数（至少 1 条），不让通知在租约内排队过久。
+        """
+        deadline = time.time() + timeout if timeout else None
+        sent = failed = timed_out = 0
+        last_id = 0
+        while deadline is None or time.time() < deadline:
+            rows, claimed = self._claim(last_id, limit=max(1, self.scraper.notifier.free_slots()))
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+
+            jobs = [(row, self._submit(row)) for row in claimed]
+            outcomes = []
+            released = []
+            for row, future in jobs:
+                remaining = max(0, deadline - time.time()) if deadline else None
+                try:
+                    outcomes.append((row, future.result(timeout=remaining)))
+                except FutureTimeoutError:
+                    timed_out += 1
+                    if future.cancel():
+                        self._forget(row['id'])
+                        released.append(row['id'])
+                    else:
+                        future.add_done_callback(lambda f, row=row: self._record_late(row, f))
+
+            # 等待推送结果时不占用数据库，结果齐了再在一个事务里写回
+            with self.scraper.transaction() as conn:
+                for row, error in outcomes:
+                    if self._record(conn, row, error):
+                        sent += 1
+                    else:
+                        failed += 1
+                conn.executemany(
+                    f"UPDATE {self.table} SET status = 'pending', next_attempt_at = 0 WHERE id = ? AND status = 'sending'",
+                    [(row_id,) for row_id in released]
+                )
+
+        with self.scraper.transaction() as conn:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE status = 'sent' AND sent_at < datetime('now', 'localtime', ?)",
+                (f"-{self.retention_days} days",)
+            )
+
+        if sent or failed or timed_out:
+            self.scraper.log(f"Outbox 投递统计 → 成功: {sent} | 失败待重试: {failed} | 超时未完成: {timed_out}")
+        return sent, failed
+
+    def run_forever(self):
+        """独立发送循环：按 poll_interval 轮询 outbox 并投递。"""
+        self.scraper.log(f"Outbox 发送循环已启动，轮询间隔 {self.poll_interval}s，表: {self.table}")
+        while True:
+            try:
+                self.drain()
+            except Exception as e:
+                self.scraper.log(f"Outbox 投递出错: {e}")
+            time.sleep(self.poll_interval)
@@ -0,0 +1,71 @@
+# 文件名: page_waits.py
+
+# 商品数量在 stable_ms 毫秒内不再变化即视为网格渲染完成；状态挂在 window 上，换页后自动重置
+STABLE_COUNT_JS = """
+([selector, stableMs]) => {
+    const count = document.querySelectorAll(selector).length;
+    const now = performance.now();
+    const state = (window.__stableCount = window.__stableCount || {});
+    const entry = state[selector];
+    if (!entry || entry.count !== count) {
+        state[selector] = {count: count, since: now};
+        return false;
+    }
+    return count > 0 && now - entry.since >= stableMs;
+}
+"""
+
+# 商品卡片内的图片全部 complete（加载成功或失败都算完成）
+IMAGES_LOADED_JS = """
+(selector) => Array.from(document.querySelectorAll(selector + ' img'))
+    .every((img) => img.complete)
+"""
+
+
+class WaitStrategy:
+    """
+    事件驱动的页面等待策略，替代 goto / 滚动之后的固定 sleep：
+      - grid_response: 商品网格数据请求的 URL 通配（如 "**/graphql*"），导航时等待该响应返回
+      - stable_ms:     商品卡片数量保持不变的时长，视为渲染完成
+      - wait_images:   是否等待卡片内图片 load 完成（屏蔽图片时应关闭）
+    所有等待都有超时上限，超时后按当前页面状态继续解析。
+    """
+
+    def __init__(self, options=None, log=print):
+        options = options or {}
+        self.grid_response = options.get("grid_response")
+        self.stable_ms = options.get("stable_ms", 500)
+        self.wait_images = options.get("wait_images", False)
+        self.timeout = options.get("timeout", 15000)
+        self.log = log
+
+    def navigate(self, page, url, tile_selector, timeout=20000):
+        """打开页面并等待商品网格就绪；商品元素始终未出现时抛出异常。"""
+        if self.grid_response:
+            try:
+                with page.expect_response(self.grid_response, timeout=timeout):
+                    page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+            except Exception as e:
+                # 数据请求可能已被缓存或命中了其它地址，退回到按元素等待
+                self.log(f"未等到网格数据请求 ({self.grid_response}): {e}")
+        else:
+            page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+        page.wait_for_selector(tile_selector, timeout=timeout)
+        self.settle(page, tile_selector)
+
+    def settle(self, page, tile_selector):
+        """等待卡片数量稳定（以及可选的图片加载），超时不报错。"""
+        # 清空上一次的计数状态，确保滚动等操作之后至少观察 stable_ms
+        page.evaluate("() => { window.__stableCount = {}; }")
+        try:
+            page.wait_for_function(
+                STABLE_COUNT_JS, arg=[tile_selector, self.stable_ms],
+                polling=100, timeout=self.timeout
+            )
+        except Exception:
+            self.log(f"商品数量在 {self.timeout}ms 内未稳定，按当前结果继续。")
+        if self.wait_images:
+            try:
+                page.wait_for_function(IMAGES_LOADED_JS, arg=tile_selector, polling=100, timeout=self.timeout)
+            except Exception:
+                self.log("部分商品图片未加载完成，按当前结果继续。")
@@ -0,0 +1,68 @@
+# 文件名: parse_pool.py
+
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from extraction import ExtractionSpec
+
+_specs = {}  # 解析进程内：抽取规则 JSON -> 已编译的 ExtractionSpec
+
+
+def extract_products(spec_options, html_text, base_url, price_locale=None):
+    """
+    在解析进程中运行（模块级函数，可被 pickle）：按抽取规则解析页面，返回商品列表。
+    编译好的 XPath 无法跨进程传递，因此只传配置字典，每个进程对同一规则只编译一次。
+    """
+    key = json.dumps([spec_options, price_locale], sort_keys=True)
+    spec = _specs.get(key)
+    if spec is None:
+        spec = _specs[key] = ExtractionSpec(spec_options, price_locale)
+    return spec.extract(html_text, base_url)
+
+
+def available_cores():
+    """本进程可用的 CPU 核数（考虑 CPU 亲和性设置）。"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_parse_pool(workers="auto"):
+    """
+    返回进程内共享的HTML解析进程池；workers 为 "auto" 时按可用核数创建。
+    常驻调度器中多个站点共用同一个池，解析负载分摊到所有核上；第一个调用者决定池的大小。
+    使用 forkserver 启动工作进程，避免在已有多个线程（调度器、数据库消费者）的进程里直接 fork。
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if workers == "auto":
+                workers = available_cores()
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=max(1, int(workers)), mp_context=context)
+        return _pool
+
+
+def shutdown_parse_pool():
+    """关闭共享的解析进程池（如果存在）。"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def completed(result):
+    """把已经得到的结果包装成已完成的 Future，使同步解析与进程池解析的调用方式一致。"""
+    future = Future()
+    future.set_result(result)
+    return future
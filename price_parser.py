@@ -0,0 +1,97 @@
+# 文件名: price_parser.py
+
+import math
+import re
+
+# 文本中的第一个数字串：逗号、句点、撇号可作分隔符；空格（含不换行空格、窄不换行空格）只在后面恰好跟 3 位数字时算千位分隔符
+_NUMBER = re.compile(r"\d+(?:[.,']\d+|[ \u00a0\u202f\u2009]\d{3}(?!\d))*")
+# 去掉数字串中所有分隔符（str.translate 比正则替换快）
+_SEPARATORS = str.maketrans('', '', ".,' \u00a0\u202f\u2009")
+
+
+def _is_plain(text):
+    """
+    快速路径判断（text 已去掉首尾空白）："1100"、"1100.5"、"1100.00" 这类数字加至多 2 位小数的文本
+    （API 返回的价格多为这种形式）。句点后恰好 3 位（"1.000"）有歧义，要按语言区判断，不走快速路径。
+    用 isdecimal 而不是 isdigit：它不认 "²" 这类上标，认的字符 float() 都能转换，无需再查 isascii。
+    至多 2 位小数时 float(text) 与整数分 / 100 是同一个浮点数，parse_price 可以直接返回 float(text)。
+    """
+    return text.replace('.', '', 1).isdecimal() and '.' not in text[:-3]
+
+
+def _decimal_comma(locale):
+    """fr-CA / fr_CA 等法语区以逗号作小数点，en-CA 等以句点作小数点；未指定时返回 None。"""
+    if not locale:
+        return None
+    return locale.lower().startswith("fr")
+
+
+def _cents_from_number(number, locale):
+    """把一个数字串（已去掉货币符号）转换为整数分。"""
+    last_dot, last_comma = number.rfind('.'), number.rfind(',')
+    last_sep = max(last_dot, last_comma)
+    if last_sep < 0:
+        return int(number.translate(_SEPARATORS)) * 100
+
+    digits_after = len(number) - last_sep - 1
+    if last_dot >= 0 and last_comma >= 0:
+        # 两种分隔符同时出现：靠后的是小数点，如 "1,100.00" / "1.100,00"
+        is_decimal = True
+    elif digits_after != 3:
+        # 只有一种分隔符：后面跟 1-2 位数字时是小数点（"1 100,00"、"99.9"），其它位数是千位分隔符
+        is_decimal = digits_after < 3
+    else:
+        # "1,000" / "1.000" 无法从文本判断，按站点语言区决定；未指定时视为千位分隔符
+        comma = _decimal_comma(locale)
+        is_decimal = comma is not None and (number[last_sep] == ',') == comma
+
+    if not is_decimal:
+        return int(number.translate(_SEPARATORS)) * 100
+    whole = number[:last_sep].translate(_SEPARATORS) or '0'
+    fraction = number[last_sep + 1:]
+    cents = int(whole) * 100 + int((fraction + '00')[:2])
+    if len(fraction) > 2 and fraction[2] >= '5':
+        cents += 1
+    return cents
+
+
+def _text_cents(text, locale):
+    match = _NUMBER.search(text)
+    return None if match is None else _cents_from_number(match.group(0), locale)
+
+
+def parse_price_cents(value, locale=None):
+    """
+    把价格转换为整数分，无法解析时返回 None。
+    支持数字、列表（取第一个元素）和各种文本格式："$1,100.00"、"1 100,00 $"（含不换行空格）、"CA$ 99.99"、"99,99 $CA"。
+    locale 为站点语言区（如 "fr-CA" / "en-CA"），只用于判断 "1,000" 这类有歧义的写法。
+    """
+    if type(value) is str:
+        text = value.strip()
+        if _is_plain(text):
+            return round(float(text) * 100)
+        return _text_cents(text, locale)
+    if isinstance(value, (list, tuple)):
+        return parse_price_cents(value[0], locale) if value else None
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, float):
+        # NaN / 无穷大不是价格，round() 会抛出 ValueError / OverflowError
+        return round(value * 100) if math.isfinite(value) else None
+    return parse_price_cents(str(value), locale)
+
+
+def parse_price(value, locale=None):
+    """与 parse_price_cents 相同，但返回浮点数（元）；无法解析时返回 None。由整数分换算，两者结果始终一致。"""
+    if type(value) is str:
+        text = value.strip()
+        if _is_plain(text):
+            return float(text)
+        cents = _text_cents(text, locale)
+    elif type(value) is float:
+        return round(value * 100) / 100 if math.isfinite(value) else None
+    else:
+        cents = parse_price_cents(value, locale)
+    return None if cents is None else cents / 100
@@ -0,0 +1,81 @@
+# 文件名: product_batch.py
+
+import sys
+
+# 每个商品的标准字段（与商品表的列一一对应）
+PRODUCT_FIELDS = ("sku_id", "product_id", "name", "url", "image_url", "list_price",
+                  "sale_price", "discount_percentage", "color", "size")
+
+# 同一商品的多个变体之间大量重复的字段：入批时驻留（intern），重复的字符串只保留一份
+_INTERNED_FIELDS = ("product_id", "url", "image_url", "color", "size")
+
+
+def _intern(value):
+    # lxml 等返回的 str 子类不能驻留，原样保存
+    return sys.intern(value) if type(value) is str else value
+
+
+class ProductBatch:
+    """
+    列式存储的一批商品：每个字段一个列表，代替每个 SKU 一个 10 键字典。
+    fetch_batches 产出、check_and_notify 比较、_upsert_batch 写库都直接使用它；
+    rows() 按列 zip 出行，直接交给 executemany，不再为每个商品预先构造元组列表。
+    遍历时按行生成字典，兼容仍按字典读取商品的代码；ProductBatch.of 把字典列表转换成批次。
+    """
+
+    __slots__ = PRODUCT_FIELDS
+
+    def __init__(self):
+        for field in PRODUCT_FIELDS:
+            setattr(self, field, [])
+
+    def append(self, sku_id, product_id, name, url, image_url, list_price, sale_price,
+               discount_percentage=0, color=None, size=None):
+        """追加一个商品；sale_price 为空时取 list_price。"""
+        self.sku_id.append(sku_id)
+        self.product_id.append(_intern(product_id))
+        self.name.append(name)
+        self.url.append(_intern(url))
+        self.image_url.append(_intern(image_url))
+        self.list_price.append(list_price)
+        self.sale_price.append(list_price if sale_price is None else sale_price)
+        self.discount_percentage.append(discount_percentage)
+        self.color.append(_intern(color))
+        self.size.append(_intern(size))
+
+    def add(self, product):
+        """追加一个商品字典（缺少的可选字段按默认值处理）。"""
+        self.append(
+            product["sku_id"], product.get("product_id"), product.get("name"), product.get("url"),
+            product.get("image_url"), product.get("list_price"), product.get("sale_price"),
+            product.get("discount_percentage", 0), product.get("color"), product.get("size")
+        )
+
+    def extend(self, products):
+        """追加另一个批次或一组商品字典。"""
+        if isinstance(products, ProductBatch):
+            for field in PRODUCT_FIELDS:
+                getattr(self, field).extend(getattr(products, field))
+        else:
+            for product in products:
+                self.add(product)
+
+    @classmethod
+    def of(cls, products):
+        """已经是批次时原样返回，否则把商品字典列表转换为批次。"""
+        if isinstance(products, cls):
+            return products
+        batch = cls()
+        batch.extend(products)
+        return batch
+
+    def rows(self, *fields):
+        """按给定字段顺序逐行产出元组（惰性，可直接交给 executemany）。"""
+        return zip(*(getattr(self, field) for field in fields))
+
+    def __len__(self):
+        return len(self.sku_id)
+
+    def __iter__(self):
+        for row in self.rows(*PRODUCT_FIELDS):
+            yield dict(zip(PRODUCT_FIELDS, row))
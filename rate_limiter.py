@@ -0,0 +1,118 @@
+# 文件名: rate_limiter.py
+
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+
+class RateLimiter:
+    """
+    简单的令牌桶限速器，按域名共享，保证每秒请求数不超过设定值。
+    线程安全，可在并发抓取的多个线程之间共用。
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """阻塞直到拿到一个令牌。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    # 暂停期间不积累令牌
+                    self._tokens = 0.0
+                    self._last = now
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def record(self, status, latency, retry_after=None):
+        """固定速率的限速器不根据响应调整，保留接口以便与自适应限速器互换。"""
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    AIMD 自适应令牌桶：响应健康（2xx/3xx 且延迟不超过 latency_target 秒）时速率加性增加 increase，
+    遇到 429/503 时乘以 decrease 快速下调；带 Retry-After 时整个域名暂停对应秒数。
+    速率始终限制在 [min_rate, max_rate] 之间。
+    """
+
+    def __init__(self, rate, burst=1, min_rate=0.2, max_rate=10, increase=0.1,
+                 decrease=0.5, latency_target=2.0, max_retry_after=300):
+        super().__init__(rate, burst)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max(max_rate, rate))
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.latency_target = latency_target
+        self.max_retry_after = max_retry_after
+        self.throttled = 0  # 累计被限流（429/503）的次数
+
+    def record(self, status, latency, retry_after=None):
+        """根据一次请求的状态码、耗时（秒）和 Retry-After 头调整速率。"""
+        pause = parse_retry_after(retry_after)
+        with self._lock:
+            if status in (429, 503) or pause:
+                self.throttled += 1
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                if pause:
+                    self._paused_until = max(self._paused_until,
+                                             time.monotonic() + min(pause, self.max_retry_after))
+            elif status < 400 and latency <= self.latency_target:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+            # 其它错误或延迟偏高：保持当前速率
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（秒数或 HTTP 日期），返回秒数；无法解析时返回 None。"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_domain_limiter(url, rate, burst=1, adaptive=None):
+    """
+    返回该 URL 所属域名的共享限速器；rate 为空时不限速，返回 None。
+    adaptive 为 AdaptiveRateLimiter 的参数字典时创建自适应限速器。
+    同一进程内同一域名只创建一次，后来者复用先创建的限速器。
+    """
+    if not rate:
+        return None
+    domain = urlparse(url).netloc
+    with _limiters_lock:
+        limiter = _limiters.get(domain)
+        if limiter is None:
+            if adaptive is not None:
+                limiter = AdaptiveRateLimiter(rate, burst, **adaptive)
+            else:
+                limiter = RateLimiter(rate, burst)
+            _limiters[domain] = limiter
+        return limiter
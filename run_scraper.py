@@ -3,40 +3,74 @@
 import sys
 import json
 from core_scraper import CoreScraper
-from sportinglife_scraper import SportingLifeScraper 
-from sportsexperts_scraper import SportsExpertsScraper 
+from sportinglife_scraper import SportingLifeScraper
+from sportsexperts_scraper import SportsExpertsScraper
 from momosports_scraper import MomoSportsScraper
 from oberson_scraper import ObersonScraper # <--- 导入新的 Oberson 爬虫
 from lacordee_scraper import LaCordeeScraper
+from orchestrator import Orchestrator
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("用法: python run_scraper.py <配置文件的路径>")
-        sys.exit(1)
 
-    config_file_path = sys.argv[1]
-    
+def create_scraper(config_file_path):
+    """根据配置文件中的 site_name 选择对应的爬虫类并实例化。"""
     with open(config_file_path, 'r', encoding='utf-8') as f:
         config = json.load(f)
     site_name = config.get("site_name")
 
     if site_name == "Sporting Life":
         print(f"识别到 {site_name} 配置，使用专属的 SportingLifeScraper。")
-        scraper = SportingLifeScraper(config_path=config_file_path)
+        return SportingLifeScraper(config_path=config_file_path)
     elif site_name == "Sports Experts":
         print(f"识别到 {site_name} 配置，使用专属的 SportsExpertsScraper。")
-        scraper = SportsExpertsScraper(config_path=config_file_path)
+        return SportsExpertsScraper(config_path=config_file_path)
     elif site_name == "Momo Sports":
         print(f"识别到 {site_name} 配置，使用专属的 MomoSportsScraper。")
-        scraper = MomoSportsScraper(config_path=config_file_path)
+        return MomoSportsScraper(config_path=config_file_path)
     elif site_name == "Oberson": # <--- 为 Oberson 添加新的逻辑分支
         print(f"识别到 {site_name} 配置，使用专属的 ObersonScraper。")
-        scraper = ObersonScraper(config_path=config_file_path)
+        return ObersonScraper(config_path=config_file_path)
     elif site_name == "LaCordee":
         print(f"识别到 {site_name} 配置，使用 LaCordeeScraper")
-        scraper = LaCordeeScraper(config_path=config_file_path)
+        return LaCordeeScraper(config_path=config_file_path)
     else:
         print(f"识别到 {site_name} 配置，使用通用的 CoreScraper。")
-        scraper = CoreScraper(config_path=config_file_path)
-    
-    scraper.run()
+        return CoreScraper(config_path=config_file_path)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args:
+        print("用法: python run_scraper.py <配置文件的路径>")
+        print("      python run_scraper.py --send-outbox <配置文件的路径> [--once]")
+        print("      python run_scraper.py --daemon <配置目录> [--max-concurrency N]")
+        sys.exit(1)
+
+    if args[0] == "--daemon":
+        if len(args) < 2:
+            print("用法: python run_scraper.py --daemon <配置目录> [--max-concurrency N]")
+            sys.exit(1)
+        max_concurrency = 2
+        if "--max-concurrency" in args:
+            max_concurrency = int(args[args.index("--max-concurrency") + 1])
+        Orchestrator(args[1], create_scraper, max_concurrency=max_concurrency).run_forever()
+        sys.exit(0)
+
+    if args[0] == "--send-outbox":
+        if len(args) < 2:
+            print("用法: python run_scraper.py --send-outbox <配置文件的路径> [--once]")
+            sys.exit(1)
+        scraper = create_scraper(args[1])
+        try:
+            if "--once" in args:
+                scraper.outbox.drain()
+            else:
+                scraper.outbox.run_forever()
+        finally:
+            scraper.close()
+        sys.exit(0)
+
+    scraper = create_scraper(args[0])
+    try:
+        scraper.run()
+    finally:
+        scraper.close()
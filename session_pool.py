@@ -0,0 +1,115 @@
+# 文件名: session_pool.py
+
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# 与 core_scraper 相同的回退逻辑：优先 curl_cffi，没有则使用 requests
+try:
+    from curl_cffi import requests
+    CURL_CFFI_AVAILABLE = True
+except ImportError:
+    import requests
+    CURL_CFFI_AVAILABLE = False
+
+
+class SessionPool:
+    """
+    按域名复用的 HTTP 会话池，由爬虫实例持有。
+    每个域名维护一组空闲会话，请求时借出一个、用完归还，同一会话不会被两个线程同时使用；
+    这样 TCP/TLS 连接在多页抓取、多轮运行和 Bark 推送之间都能保持复用。
+    伪装浏览器配置、公共请求头和 Cookie 只在创建会话时合并一次；
+    curl_cffi 在伪装 Chrome 时会通过 ALPN 协商 HTTP/2，回退到 requests 时为 HTTP/1.1 keep-alive。
+    """
+
+    def __init__(self, headers=None, cookies=None, impersonate=None, max_idle_per_host=8):
+        self.headers = dict(headers or {})
+        self.cookies = dict(cookies or {})
+        self.impersonate = impersonate
+        self.max_idle_per_host = max_idle_per_host
+        self._lock = threading.Lock()
+        self._idle = {}  # host -> 空闲会话列表（后进先出，优先复用最热的连接）
+        self._seed_cookies = {}  # host -> 从持久化 Cookie 罐载入的 Cookie
+
+    def _new_session(self, host):
+        if CURL_CFFI_AVAILABLE and self.impersonate:
+            session = requests.Session(impersonate=self.impersonate)
+        else:
+            session = requests.Session()
+        session.headers.update(self.headers)
+        for name, value in self.cookies.items():
+            session.cookies.set(name, value)
+        # 同域名已有会话时，继承它拿到的 Cookie（例如首页下发的会话 Cookie）；否则使用持久化的 Cookie
+        with self._lock:
+            donors = self._idle.get(host) or []
+            inherited = _cookie_records(donors[-1]) if donors else self._seed_cookies.get(host, [])
+        _apply_cookies(session, inherited)
+        return session
+
+    @contextmanager
+    def session(self, url):
+        """借出 url 所在域名的一个会话，退出时归还。"""
+        host = urlparse(url).netloc
+        with self._lock:
+            idle = self._idle.get(host)
+            session = idle.pop() if idle else None
+        if session is None:
+            session = self._new_session(host)
+        try:
+            yield session
+        finally:
+            with self._lock:
+                idle = self._idle.setdefault(host, [])
+                if len(idle) < self.max_idle_per_host:
+                    idle.append(session)
+                    session = None
+            if session is not None:
+                session.close()
+
+    def request(self, method, url, **kwargs):
+        with self.session(url) as session:
+            return session.request(method, url, **kwargs)
+
+    def load_cookies(self, host, cookies):
+        """载入持久化的 Cookie：之后新建的会话和当前空闲会话都会带上。"""
+        with self._lock:
+            self._seed_cookies[host] = list(cookies)
+            for session in self._idle.get(host, []):
+                _apply_cookies(session, cookies)
+
+    def dump_cookies(self, host):
+        """导出该域名最近使用的会话中的 Cookie（字典列表），用于持久化。"""
+        with self._lock:
+            idle = self._idle.get(host)
+            return _cookie_records(idle[-1]) if idle else list(self._seed_cookies.get(host, []))
+
+    def clear_cookies(self, host):
+        """清空该域名的 Cookie（服务端拒绝旧 Cookie 时调用）。"""
+        with self._lock:
+            self._seed_cookies.pop(host, None)
+            for session in self._idle.get(host, []):
+                session.cookies.clear()
+
+    def close(self):
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle = {}
+        for session in sessions:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+
+def _cookie_records(session):
+    """把会话 Cookie 罐中的 Cookie 转成可 JSON 序列化的字典列表。"""
+    jar = getattr(session.cookies, 'jar', session.cookies)
+    return [
+        {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "expires": c.expires}
+        for c in jar
+    ]
+
+
+def _apply_cookies(session, cookies):
+    for c in cookies:
+        session.cookies.set(c["name"], c["value"], domain=c.get("domain") or "", path=c.get("path") or "/")
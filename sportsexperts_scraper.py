@@ -1,9 +1,8 @@
 # 文件名: sportsexperts_scraper.py
 
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup
-from core_scraper import CoreScraper, requests
-import time
+from core_scraper import CoreScraper
+from product_batch import ProductBatch
 
 class SportsExpertsScraper(CoreScraper):
     """
@@ -11,31 +10,8 @@ class SportsExpertsScraper(CoreScraper):
     """
     
     def _parse_html_products(self, html_text, base_url):
-        soup = BeautifulSoup(html_text, 'lxml')
-        products = []
-        product_tiles = soup.select('div.product-tile[data-product-id]')
-        for tile in product_tiles:
-            try:
-                product_id = tile.get('data-product-id')
-                name_tag = tile.select_one('a[data-qa="search-product-title"]')
-                price_tag = tile.select_one('span[data-qa="search-product-price"]')
-                link_tag = tile.select_one('a.product-tile-media')
-                image_tag = tile.select_one('img.img-fluid')
-                if not (product_id and name_tag and price_tag and link_tag): continue
-                name = name_tag.text.strip()
-                price_str = price_tag.text.strip().replace('$', '').replace(',', '')
-                price = float(price_str) if price_str else 0.0
-                product_url = urljoin(base_url, link_tag.get('href'))
-                image_url = image_tag.get('src') if image_tag else None
-                href = link_tag.get('href', '')
-                sku_id = href.split('/')[-1] if '/' in href else product_id
-                products.append({
-                    "sku_id": sku_id, "product_id": product_id, "name": name, "url": product_url, 
-                    "image_url": image_url, "list_price": price, "sale_price": price, 
-                    "discount_percentage": 0, "color": None, "size": None
-                })
-            except Exception as e: self.log(f"⚠️ 解析单个HTML商品时出错: {e}")
-        return products
+        """按配置中的 extraction 规则解析主页HTML中的商品卡片（引导请求之后才开始抓API，没有可重叠的下载，直接解析）。"""
+        return self.parse_html_products(html_text)
 
     def _parse_json_products(self, data, base_url):
         """
@@ -44,7 +20,7 @@ class SportsExpertsScraper(CoreScraper):
         search_results = data.get("ProductSearchResults", {})
         items = search_results.get("SearchResults", [])
         total_count = search_results.get("TotalCount", 0)
-        products = []
+        products = ProductBatch()
         
         # --- 核心修正：不再按 ProductId 去重 ---
         for item in items:
@@ -54,75 +30,156 @@ class SportsExpertsScraper(CoreScraper):
             sale_price = pricing.get("Price") or list_price
             discount = round((1 - sale_price / list_price) * 100) if list_price and sale_price and list_price > sale_price else 0
             
-            products.append({
-                "sku_id": item.get("VariantId"), # 每个Variant都是唯一的
-                "product_id": product_id,
-                "name": item.get("DisplayName"),
-                "url": urljoin(base_url, item.get("Url")),
-                "image_url": item.get("ImageUrl"),
-                "list_price": list_price,
-                "sale_price": sale_price,
-                "discount_percentage": discount,
-                "color": None, "size": None
-            })
+            products.append(
+                sku_id=item.get("VariantId"), # 每个Variant都是唯一的
+                product_id=product_id,
+                name=item.get("DisplayName"),
+                url=urljoin(base_url, item.get("Url")),
+                image_url=item.get("ImageUrl"),
+                list_price=list_price,
+                sale_price=sale_price,
+                discount_percentage=discount,
+            )
         return products, total_count
 
 
-    def fetch_data(self):
-        """重写数据抓取方法，引入Session对象来自动管理Cookie。"""
-        all_products = []
-        
-        session = requests.Session()
-        session.headers.update(self.headers)
-        
-        try:
-            main_page_url = self.cfg.get("main_page_url")
-            if not main_page_url:
-                self.log("❌ 配置文件中缺少 'main_page_url'。")
-                return []
-            self.log(f"📦 正在访问主页以获取Cookie...")
-            response = session.get(main_page_url, impersonate=self.impersonate, timeout=30)
-            response.raise_for_status()
-            
-            self.log(f"✅ 第 1 页HTML内容获取成功，开始解析...")
-            page1_products = self._parse_html_products(response.text, self.base_url)
-            all_products.extend(page1_products)
-            self.log(f"✅ 第 1 页解析成功，找到 {len(page1_products)} 个商品。")
-        except Exception as e:
-            self.log(f"❌ 抓取第 1 页 (HTML) 失败: {e}")
+    def _api_payload(self, page, page_size):
+        payload = self.payload_template.copy()
+        payload["Page"] = page
+        payload["PageSize"] = page_size
+        payload["StartIndex"] = (page - 1) * page_size
+        return payload
+
+    def _probe_api_page(self, size):
+        """以指定每页条数请求API第 1 页，返回 ((商品列表, 商品总数), 返回条数, 商品总数)，供每页条数试探使用。"""
+        result = self._fetch_api_page(1, size)
+        if result is None:
+            raise RuntimeError("API拒绝访问 (401/403)")
+        products, total_count = result
+        return result, len(products), total_count
+
+    def _fetch_api_page(self, page, page_size):
+        """
+        请求API的一页，返回 (商品列表, 商品总数)；服务端以 401/403 拒绝时返回 None。
+        每页条数试探时已抓过的第 1 页直接复用，不再重复请求和解析。
+        """
+        probed = self.probed_page(page, page_size)
+        if probed is not None:
+            return probed
+        response = self._make_request("POST", self.api_url, json=self._api_payload(page, page_size))
+        if response.status_code in (401, 403):
+            self.log(f"⚠️ API返回 {response.status_code}。")
+            return None
+        response.raise_for_status()
+        return self._parse_json_products(response.json(), self.base_url)
+
+    def _bootstrap(self, main_page_url):
+        """
+        访问主页获取Cookie（同时解析第 1 页的HTML商品），成功后把Cookie写入Cookie罐。
+        主页商品暂存到 fetch_batches 把它们作为第 0 页产出为止（见 _take_homepage_products）。
+        """
+        self.log(f"📦 正在访问主页以获取Cookie...")
+        response = self._make_request("GET", main_page_url, timeout=30)
+        response.raise_for_status()
+        self.persist_cookies(main_page_url)
+
+        self.log(f"✅ 第 1 页HTML内容获取成功，开始解析...")
+        page1_products = self._parse_html_products(response.text, self.base_url)
+        self.log(f"✅ 第 1 页解析成功，找到 {len(page1_products)} 个商品。")
+        self._homepage_products = page1_products
+        return page1_products
+
+    def _take_homepage_products(self):
+        """取出引导请求解析到、尚未产出的主页商品（只能取一次），没有时返回空列表。"""
+        products, self._homepage_products = self._homepage_products, None
+        return products or []
+
+    def _fetch_api_products(self, page, page_size, main_page_url):
+        """抓取后续的一页并返回商品列表；被拒绝时（本次运行尚未刷新过）重新访问主页一次后重试。"""
+        products, _ = self.fetch_with_cookie_refresh(
+            page, lambda: self._fetch_api_page(page, page_size),
+            main_page_url, lambda: self._bootstrap(main_page_url)
+        )
+        return products
+
+    def fetch_batches(self):
+        """
+        重写数据抓取方法，逐页产出 (页码, 商品列表)；主页HTML作为第 0 页。
+        Cookie罐中有未过期的Cookie时跳过主页，直接从API第 1 页开始；
+        否则先访问主页获取Cookie。API返回 401/403 时重新访问主页一次，这次拿到的主页商品同样作为第 0 页产出。
+        第一个API页给出商品总数后，其余页面一次全部排入抓取队列，按 concurrency 并发抓取、按页码顺序产出。
+        每页失败时按退避重试，最终失败的页记录为检查点，下次运行从该页续抓。
+        """
+        main_page_url = self.cfg.get("main_page_url")
+        if not main_page_url:
+            self.log("❌ 配置文件中缺少 'main_page_url'。")
+            return
+
+        self._homepage_products = None
+        if not self.restore_cookies(main_page_url):
+            self._crawl["bootstrapped"] = True
+            try:
+                self._bootstrap(main_page_url)
+            except Exception as e:
+                self.log(f"❌ 抓取第 1 页 (HTML) 失败: {e}")
+        html_products = self._take_homepage_products()
+        if html_products:
+            yield 0, html_products
         
         pagination = self.cfg.get("pagination", {})
-        page_size = pagination.get("page_size", 24)
-        max_pages = pagination.get("max_pages", 15)
-        
-        # 使用一个变量来存储从API获取的商品总数
-        total_api_count = 0
+        default_size = pagination.get("page_size", 24)
+        page_size = self.tuned_page_size(default_size, self._probe_api_page)
+        # 每页条数变大后按相同的商品覆盖量重新计算最大页数
+        max_pages = -(-pagination.get("max_pages", 15) * default_size // page_size)
+
+        self.page_size = page_size
+        # 主页HTML已包含前 N 个商品，API从第一个未覆盖完的页开始；上次中断时从中断的页续抓
+        page = max(len(html_products) // page_size + 1, self.resume_page(page_size))
 
-        for page in range(2, max_pages + 1):
+        # --- 第一个API页：处理Cookie失效，并拿到商品总数 ---
+        result = None
+        while result is None and page <= max_pages:
             self.log(f"📦 正在抓取第 {page}/{max_pages} 页 (通过API)...")
-            payload = self.payload_template.copy()
-            payload["Page"] = page
-            payload["StartIndex"] = (page - 1) * page_size
-            
             try:
-                response = session.post(self.api_url, json=payload, impersonate=self.impersonate, timeout=20)
-                response.raise_for_status()
-                json_data = response.json()
-                
-                page_products, total_api_count = self._parse_json_products(json_data, self.base_url)
-                
-                if not page_products:
-                    self.log("ℹ️ API返回内容为空，已抓取完所有后续页面，停止翻页。")
-                    break
-                all_products.extend(page_products)
-
-                # 使用从API获取的总数来判断是否提前结束
-                if total_api_count > 0 and len(all_products) >= total_api_count:
-                    self.log(f"已抓取 {len(all_products)}/{total_api_count} 个商品，提前结束。")
-                    break
-                
-                time.sleep(self.cfg.get("delay", 1))
+                result = self.fetch_page_with_retry(
+                    page, lambda: self._fetch_api_page(page, page_size), page_size
+                )
+                if result is None:
+                    refreshed = self.refresh_cookies_once(main_page_url, lambda: self._bootstrap(main_page_url))
+                    if not refreshed:
+                        self.checkpoint_page_failed(page, 1, "API拒绝访问 (401/403)", page_size)
+                        self.log(f"❌ 重新获取Cookie后第 {page} 页仍被拒绝，停止翻页。")
+                        return
+                    # 重新访问主页拿到的商品同样入库（包括从后面的页续抓时），不随页码丢弃；
+                    # 主页本身就包含前 N 个商品，API从第一个未覆盖完的页继续
+                    html_products = self._take_homepage_products()
+                    if html_products:
+                        yield 0, html_products
+                        page = max(page, len(html_products) // page_size + 1)
             except Exception as e:
                 self.log(f"❌ 抓取第 {page} 页 (API) 失败: {e}")
-                break
-        return all_products
\ No newline at end of file
+                return
+        if result is None:
+            return
+
+        page_products, total_api_count = result
+        if not page_products:
+            self.log("ℹ️ API返回内容为空，已抓取完所有后续页面，停止翻页。")
+            return
+        yield page, page_products
+
+        # --- 其余页面：按API返回的总数一次排好 ---
+        # 主页HTML与API的商品可能重叠，按位置而不是条数判断最后一页
+        last_page = min(max_pages, -(-total_api_count // page_size)) if total_api_count > 0 else max_pages
+        if page >= last_page:
+            self.log(f"已抓取到第 {total_api_count} 个商品所在的最后一页，提前结束。")
+            return
+        yield from self._fetch_pages_concurrently(
+            last_page, self.cfg.get("concurrency", 1), page + 1,
+            fetch_page=lambda p: self._fetch_api_products(p, page_size, main_page_url),
+            window=last_page - page if total_api_count > 0 else None
+        )
+        # 并发抓取中途因 Cookie 失效重新访问了主页：主页商品在最后补上
+        html_products = self._take_homepage_products()
+        if html_products:
+            yield 0, html_products
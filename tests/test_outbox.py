@@ -0,0 +1,73 @@
+# 文件名: tests/test_outbox.py
+#
+# 用法: python -m pytest -q tests/
+
+import json
+import os
+import sys
+import threading
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from core_scraper import CoreScraper  # noqa: E402
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def raise_for_status(self):
+        pass
+
+
+class BlockingBarkScraper(CoreScraper):
+    """推送在 release 被设置之前一直阻塞，模拟响应很慢的 Bark 端点。"""
+
+    def __init__(self, config_path):
+        self.release = threading.Event()
+        self.pushes = Counter()
+        self._push_lock = threading.Lock()
+        super().__init__(config_path)
+
+    def _post_bark(self, bark_url, payload):
+        with self._push_lock:
+            self.pushes[payload["title"]] += 1
+        self.release.wait(5)
+        return FakeResponse()
+
+
+def test_dispatch_does_not_resend_rows_still_queued(tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({
+        "site_name": "Outbox Test",
+        "db_path": str(tmp_path / "outbox.db"),
+        "log_path": str(tmp_path / "outbox.log"),
+        "bark_urls": ["https://bark.example/key/"],
+        "icon_url": "",
+        "notify_workers": 2,
+        "outbox": {"lease_seconds": 0},  # 租约立即到期：只靠空闲数和在途登记防止重复领取
+    }), encoding="utf-8")
+    scraper = BlockingBarkScraper(str(config_path))
+    try:
+        for i in range(5):
+            scraper.send_bark_notification(f"alert {i}", "body", "", "")
+        with scraper.transaction() as conn:
+            scraper._write_outbox(conn.cursor())
+        scraper._pending_alerts = []
+
+        assert scraper.outbox.dispatch() == 2  # 只领取线程池空闲数
+        assert scraper.outbox.dispatch() == 0  # 线程池忙、在途的行租约虽已到期也不再领取
+
+        scraper.release.set()
+        scraper.notifier.flush(5)
+        scraper.outbox.drain(5)
+        status = dict(scraper.connect_db().execute(
+            f"SELECT status, COUNT(*) FROM {scraper.outbox_table} GROUP BY status"
+        ).fetchall())
+    finally:
+        scraper.release.set()
+        scraper.close()
+
+    assert status == {"sent": 5}
+    assert sorted(scraper.pushes.values()) == [1] * 5
@@ -0,0 +1,164 @@
+# 文件名: tests/test_sportsexperts_scraper.py
+#
+# 用法: python -m pytest -q tests/
+
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import session_pool  # noqa: E402
+from sportsexperts_scraper import SportsExpertsScraper  # noqa: E402
+
+TOTAL = 100      # API 商品总数
+HOMEPAGE = 96    # 主页HTML（sz=96）中的商品数
+PAGE_SIZE = 24
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, text="", data=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
+        self._data = data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._data
+
+
+def homepage_html():
+    tiles = "".join(
+        f'<div class="product-tile" data-product-id="P{i}">'
+        f'<a class="product-tile-media" href="/p/V{i}"><img class="img-fluid" src="/i/{i}.jpg"></a>'
+        f'<a data-qa="search-product-title">Jacket {i}</a>'
+        f'<span data-qa="search-product-price">$1{i}.00</span></div>'
+        for i in range(HOMEPAGE)
+    )
+    return f"<html><body>{tiles}</body></html>"
+
+
+class FakeSportsExperts(SportsExpertsScraper):
+    """用内存中的假响应代替网络：API 对 denied 中的页返回一次 401，主页返回 HOMEPAGE 个商品卡片。"""
+
+    def __init__(self, config_path, denied=()):
+        self.denied = set(denied)
+        self.requests = []
+        super().__init__(config_path)
+
+    def restore_cookies(self, url):
+        return True  # 模拟Cookie罐中有（已在服务端失效的）Cookie，跳过开头的主页请求
+
+    def persist_cookies(self, url):
+        pass
+
+    def _make_request(self, method, url, rate_limit=True, **kwargs):
+        if method == "GET":
+            self.requests.append("homepage")
+            return FakeResponse(text=homepage_html())
+        page = kwargs["json"]["Page"]
+        self.requests.append(page)
+        if page in self.denied:
+            self.denied.discard(page)
+            return FakeResponse(401)
+        start = (page - 1) * PAGE_SIZE
+        items = [
+            {"ProductId": f"P{i}", "VariantId": f"V{i}", "DisplayName": f"Jacket {i}", "Url": f"/p/V{i}",
+             "Pricing": {"ListPrice": 20.0, "Price": 15.0}}
+            for i in range(start, min(start + PAGE_SIZE, TOTAL))
+        ]
+        return FakeResponse(data={"ProductSearchResults": {"SearchResults": items, "TotalCount": TOTAL}})
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    with open(os.path.join(ROOT, "configs", "sportsexperts_config.json"), encoding="utf-8") as f:
+        cfg = json.load(f)
+    cfg.pop("page_size_probe")
+    cfg.update(
+        db_path=str(tmp_path / "sportsexperts.db"),
+        log_path=str(tmp_path / "sportsexperts.log"),
+        concurrency=1,
+        delay=0,
+        page_backoff=0,
+    )
+    path = tmp_path / "sportsexperts_config.json"
+    path.write_text(json.dumps(cfg), encoding="utf-8")
+    return str(path)
+
+
+def test_resumed_crawl_keeps_homepage_products_after_401(config_path):
+    scraper = FakeSportsExperts(config_path, denied={3})
+    try:
+        # 上次运行在第 3 页失败，本次从第 3 页续抓
+        scraper.checkpoint_page_failed(3, 3, "timeout", PAGE_SIZE)
+        scraper.current_gen = None
+        scraper._crawl["failed"] = False
+
+        batches = list(scraper.fetch_batches())
+    finally:
+        scraper.close()
+
+    pages = [page for page, _ in batches]
+    # 第 3 页被拒绝 → 重新访问主页；主页商品作为第 0 页产出，API 从主页未覆盖完的第 5 页继续
+    assert scraper.requests == [3, "homepage", 5]
+    assert pages == [0, 5]
+    assert len(batches[0][1]) == HOMEPAGE
+    assert list(batches[0][1].sku_id)[:2] == ["V0", "V1"]
+    assert len(batches[1][1]) == TOTAL - HOMEPAGE
+
+
+def api_items(page, total):
+    start = (page - 1) * PAGE_SIZE
+    return [
+        {"ProductId": f"P{i}", "VariantId": f"V{i}", "DisplayName": f"Jacket {i}", "Url": f"/p/V{i}",
+         "Pricing": {"ListPrice": 20.0, "Price": 15.0}}
+        for i in range(start, min(start + PAGE_SIZE, total))
+    ]
+
+
+def test_concurrent_pages_share_bootstrap_cookies(config_path, monkeypatch):
+    """全新运行（没有保存的Cookie）且 concurrency > 1：主页下发的Cookie要带到每个并发借出的会话上。"""
+    total = 200  # 主页覆盖前 96 个商品，API 第 5 页之后还有 6-9 页并发抓取
+    lock = threading.Lock()
+    seen = []  # (页码, 是否带了主页下发的Cookie, 会话 id)
+
+    def fake_request(session, method, url, **kwargs):
+        if method == "GET":
+            session.cookies.set("auth", "fresh")
+            return FakeResponse(text=homepage_html())
+        page = kwargs["json"]["Page"]
+        authorized = session.cookies.get("auth") == "fresh"
+        with lock:
+            seen.append((page, authorized, id(session)))
+        time.sleep(0.05)  # 让并发的页面同时借出不同的会话
+        if not authorized:
+            return FakeResponse(401)
+        return FakeResponse(data={"ProductSearchResults": {"SearchResults": api_items(page, total), "TotalCount": total}})
+
+    monkeypatch.setattr(session_pool.requests.Session, "request", fake_request)
+    with open(config_path, encoding="utf-8") as f:
+        cfg = json.load(f)
+    cfg["concurrency"] = 2
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(cfg, f)
+
+    scraper = SportsExpertsScraper(config_path)
+    try:
+        batches = list(scraper.fetch_batches())
+        failed = scraper._crawl["failed"]
+    finally:
+        scraper.close()
+
+    assert len({session_id for _, _, session_id in seen}) >= 2  # 确实有两个会话并发
+    assert all(authorized for _, authorized, _ in seen), seen
+    assert not failed
+    assert [page for page, _ in batches] == [0, 5, 6, 7, 8, 9]